@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benjaminkley.settings')
 
 application = get_asgi_application()
+
+# Fail fast if anything reachable from the URLconf imports the scan ML stack.
+from scans.checks import assert_ml_stack_not_loaded
+assert_ml_stack_not_loaded()
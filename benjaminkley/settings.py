@@ -5,6 +5,7 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 import dj_database_url
+from kombu import Queue
 
 # Load environment variables from a .env file (for local development)
 load_dotenv()
@@ -96,6 +97,50 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# --- FILE STORAGE ---
+# Scan photos and everything the pipeline writes (meshes, landmarks,
+# checkpoints) go through the default storage. With SCAN_STORAGE_BUCKET set
+# they live in an S3-compatible bucket (MinIO in compose.yaml), so the web and
+# worker containers need no shared media volume.
+SCAN_STORAGE_BUCKET = os.getenv('SCAN_STORAGE_BUCKET', '')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+if SCAN_STORAGE_BUCKET:
+    STORAGES['default'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': SCAN_STORAGE_BUCKET,
+            'endpoint_url': os.getenv('AWS_S3_ENDPOINT_URL') or None,
+            'access_key': os.getenv('AWS_ACCESS_KEY_ID'),
+            'secret_key': os.getenv('AWS_SECRET_ACCESS_KEY'),
+            'region_name': os.getenv('AWS_S3_REGION_NAME') or None,
+            # Object URLs keep the endpoint's host, which nginx proxies to (see SCAN_STORAGE_INTERNAL_PREFIX).
+            'addressing_style': 'path',
+        },
+    }
+# Scan file downloads are authorised by Django and then served by nginx from an
+# internal location (X-Accel-Redirect): /protected-media/ for filesystem storage,
+# /protected-storage/ (proxied to the bucket) for object storage. Turn off only
+# when running without nginx, e.g. under runserver. /protected-media/ needs
+# MEDIA_ROOT mounted in the nginx container (compose.yaml shares a 'media' volume).
+SCAN_MEDIA_X_ACCEL = os.getenv('SCAN_MEDIA_X_ACCEL', 'True').lower() == 'true'
+SCAN_MEDIA_INTERNAL_PREFIX = '/protected-media/'
+SCAN_STORAGE_INTERNAL_PREFIX = '/protected-storage/'
+
+# --- CACHES ---
+# 'scans' holds serialized scan details (see scans/detail_cache.py) in Redis,
+# shared by every web worker.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'scans': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('SCAN_DETAIL_CACHE_URL', os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')),
+        'KEY_PREFIX': 'benjaminkley',
+    },
+}
+
 # --- CELERY AND REDIS CONFIGURATION (FLEXIBLE) ---
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
@@ -103,6 +148,115 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Worker children load the AI models in worker_process_init, which takes longer
+# than Celery's default 4 second start-up allowance.
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = 60
+# Queues: 'scans' for uploads a user is waiting on, 'scans_bulk' for reprocessing
+# backfills and 'io' for light housekeeping. Each gets its own workers (see
+# compose.yaml), so a backfill never delays a new scan.
+CELERY_TASK_QUEUES = (Queue('scans'), Queue('scans_bulk'), Queue('io'))
+CELERY_TASK_DEFAULT_QUEUE = 'io'
+CELERY_TASK_ROUTES = {
+    'scans.tasks.process_scan_task': {'queue': 'scans'},
+    'scans.tasks.reprocess_scan_task': {'queue': 'scans_bulk'},
+    # A scan's view and finish tasks are sent to its entry task's queue;
+    # these routes only apply when they are called on their own.
+    'scans.tasks.analyze_view_task': {'queue': 'scans'},
+    'scans.tasks.finish_scan_task': {'queue': 'scans'},
+    'scans.tasks.fail_scan_task': {'queue': 'io'},
+    'scans.tasks.fail_stale_scans': {'queue': 'io'},
+    'scans.tasks.expire_scan_uploads': {'queue': 'io'},
+}
+# Tasks are acknowledged only once they finish, so a scan whose worker dies is
+# redelivered instead of lost. Each process reserves a single message, so a
+# long scan never holds others back behind it.
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    'fail-stale-scans': {'task': 'scans.tasks.fail_stale_scans', 'schedule': timedelta(minutes=10)},
+    'expire-scan-uploads': {'task': 'scans.tasks.expire_scan_uploads', 'schedule': timedelta(hours=1)},
+}
+# Scan status and stage events are published here and streamed to clients by
+# /api/scans/events/. The stream sends a keep-alive comment when idle this long.
+SCAN_EVENTS_REDIS_URL = os.getenv('SCAN_EVENTS_REDIS_URL', os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0'))
+SCAN_EVENTS_HEARTBEAT_SECONDS = float(os.getenv('SCAN_EVENTS_HEARTBEAT_SECONDS', '15'))
+
+# --- SCAN PIPELINE ---
+# Bump whenever a pipeline change alters measurements or meshes. Completed scans
+# are only reused for identical uploads processed by the same version.
+SCAN_PIPELINE_VERSION = '2'
+# Per-queue time limits (seconds). At the soft limit the scan is marked failed;
+# the hard limit kills the worker process shortly after.
+SCAN_TASK_SOFT_TIME_LIMIT = int(os.getenv('SCAN_TASK_SOFT_TIME_LIMIT', '300'))
+SCAN_TASK_TIME_LIMIT = int(os.getenv('SCAN_TASK_TIME_LIMIT', '330'))
+SCAN_BULK_TASK_SOFT_TIME_LIMIT = int(os.getenv('SCAN_BULK_TASK_SOFT_TIME_LIMIT', '900'))
+SCAN_BULK_TASK_TIME_LIMIT = int(os.getenv('SCAN_BULK_TASK_TIME_LIMIT', '960'))
+# A scan redelivered after its worker died is given up on after this many runs.
+SCAN_TASK_MAX_ATTEMPTS = int(os.getenv('SCAN_TASK_MAX_ATTEMPTS', '2'))
+# Runs still PROCESSING this long after their last heartbeat (a view or finish
+# task starting, or a stage finishing) are marked failed. Re-runs wait behind
+# every other re-run on the scans_bulk queue, so they get far longer.
+SCAN_STALE_AFTER_MINUTES = int(os.getenv('SCAN_STALE_AFTER_MINUTES', '60'))
+SCAN_REPROCESS_STALE_AFTER_MINUTES = int(os.getenv('SCAN_REPROCESS_STALE_AFTER_MINUTES', '1440'))
+# Longest edge (px) a photo is downsized to before landmark detection.
+SCAN_MAX_IMAGE_EDGE = int(os.getenv('SCAN_MAX_IMAGE_EDGE', '1280'))
+# Page size of GET /api/scans/ (clients may ask for up to the maximum with ?page_size=).
+SCAN_LIST_PAGE_SIZE = int(os.getenv('SCAN_LIST_PAGE_SIZE', '50'))
+SCAN_LIST_MAX_PAGE_SIZE = int(os.getenv('SCAN_LIST_MAX_PAGE_SIZE', '200'))
+# How long a finished scan's serialized detail stays in the 'scans' cache.
+SCAN_DETAIL_CACHE_SECONDS = int(os.getenv('SCAN_DETAIL_CACHE_SECONDS', str(24 * 60 * 60)))
+# Resumable chunked uploads (see ScanUploadViewSet). Chunks are staged in
+# SCAN_UPLOAD_DIR, which must be shared by the web containers and the worker
+# consuming the 'io' queue (expire_scan_uploads deletes abandoned chunks there).
+# With filesystem storage, finalizing moves the photos into place instead of
+# copying them.
+SCAN_UPLOAD_DIR = os.getenv('SCAN_UPLOAD_DIR', os.path.join(MEDIA_ROOT, 'scans', 'uploads'))
+SCAN_UPLOAD_MAX_FILE_SIZE = int(os.getenv('SCAN_UPLOAD_MAX_FILE_SIZE', str(25 * 1024 * 1024)))
+SCAN_UPLOAD_MAX_CHUNK_SIZE = int(os.getenv('SCAN_UPLOAD_MAX_CHUNK_SIZE', str(8 * 1024 * 1024)))
+SCAN_UPLOAD_EXPIRE_HOURS = int(os.getenv('SCAN_UPLOAD_EXPIRE_HOURS', '24'))
+# Workers keep the photos they fetch from storage in a local LRU cache, keyed
+# by content hash, so a retried scan does not download them again.
+SCAN_ARTIFACT_CACHE_DIR = os.getenv('SCAN_ARTIFACT_CACHE_DIR', '/tmp/scan-artifacts')
+SCAN_ARTIFACT_CACHE_MAX_MB = int(os.getenv('SCAN_ARTIFACT_CACHE_MAX_MB', '1024'))
+# Image quality gate, run on upload (if SCAN_QUALITY_CHECK_AT_UPLOAD) and as the
+# pipeline's first check. Brightness is the mean 0-255 grey level and sharpness
+# the Laplacian variance, both measured on a thumbnail of the given edge.
+SCAN_QUALITY_CHECK_AT_UPLOAD = os.getenv('SCAN_QUALITY_CHECK_AT_UPLOAD', 'True').lower() == 'true'
+SCAN_QUALITY_THUMBNAIL_EDGE = int(os.getenv('SCAN_QUALITY_THUMBNAIL_EDGE', '512'))
+SCAN_QUALITY_MIN_EDGE = int(os.getenv('SCAN_QUALITY_MIN_EDGE', '480'))
+SCAN_QUALITY_MIN_BRIGHTNESS = float(os.getenv('SCAN_QUALITY_MIN_BRIGHTNESS', '40'))
+SCAN_QUALITY_MAX_BRIGHTNESS = float(os.getenv('SCAN_QUALITY_MAX_BRIGHTNESS', '220'))
+SCAN_QUALITY_MIN_SHARPNESS = float(os.getenv('SCAN_QUALITY_MIN_SHARPNESS', '8'))
+# Face ROI: the SSD runs on a copy of each view bounded to this edge, and only
+# the detected face, padded by this fraction of its size per side, is passed
+# to the gender net and FaceMesh.
+SCAN_FACE_DETECTION_EDGE = int(os.getenv('SCAN_FACE_DETECTION_EDGE', '300'))
+SCAN_FACE_DETECTION_CONFIDENCE = float(os.getenv('SCAN_FACE_DETECTION_CONFIDENCE', '0.5'))
+SCAN_FACE_ROI_PADDING = float(os.getenv('SCAN_FACE_ROI_PADDING', '0.4'))
+# Where the base head OBJs are cached as memory-mappable .npy arrays.
+SCAN_MESH_CACHE_DIR = os.getenv('SCAN_MESH_CACHE_DIR', str(AI_MODELS_DIR / 'base_heads' / 'cache'))
+# Millimetres per unit of the base head OBJs; surface measurements are taken
+# off the reconstructed mesh and converted with this.
+SCAN_BASE_HEAD_UNIT_MM = float(os.getenv('SCAN_BASE_HEAD_UNIT_MM', '1.0'))
+# Output meshes: GLB positions stored as uint16 on a 2**bits grid with
+# KHR_mesh_quantization (at most 16; 0 = float32), and the clustering grid
+# (cells along the longest axis) of the preview LOD (0 = no preview).
+SCAN_MESH_QUANTIZATION_BITS = int(os.getenv('SCAN_MESH_QUANTIZATION_BITS', '14'))
+SCAN_MESH_PREVIEW_GRID = int(os.getenv('SCAN_MESH_PREVIEW_GRID', '48'))
+# Optional host-local inference server (manage.py run_inference_server). When the
+# socket is unset or nothing listens on it, workers run the models in-process.
+SCAN_INFERENCE_SOCKET = os.getenv('SCAN_INFERENCE_SOCKET', '')
+SCAN_INFERENCE_TIMEOUT = float(os.getenv('SCAN_INFERENCE_TIMEOUT', '30'))
+SCAN_INFERENCE_BATCH_WINDOW_MS = float(os.getenv('SCAN_INFERENCE_BATCH_WINDOW_MS', '10'))
+SCAN_INFERENCE_MAX_BATCH = int(os.getenv('SCAN_INFERENCE_MAX_BATCH', '16'))
+SCAN_INFERENCE_FACE_MESH_THREADS = int(os.getenv('SCAN_INFERENCE_FACE_MESH_THREADS', '2'))
+# Gender net runtime: 'opencv' (Caffe through cv2.dnn) or 'onnx' (ONNX Runtime,
+# see manage.py quantize_gender_model). 0 threads lets ONNX Runtime decide.
+SCAN_GENDER_BACKEND = os.getenv('SCAN_GENDER_BACKEND', 'opencv')
+SCAN_GENDER_ONNX_MODEL = os.getenv('SCAN_GENDER_ONNX_MODEL', str(AI_MODELS_DIR / 'gender_detection' / 'gender_net.int8.onnx'))
+SCAN_ORT_INTRA_OP_THREADS = int(os.getenv('SCAN_ORT_INTRA_OP_THREADS', '1'))
+SCAN_ORT_INTER_OP_THREADS = int(os.getenv('SCAN_ORT_INTER_OP_THREADS', '1'))
 
 # --- TEMPLATES ---
 TEMPLATES = [
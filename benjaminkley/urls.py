@@ -1,7 +1,5 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,6 +8,5 @@ urlpatterns = [
     path('api/scans/', include('scans.urls')),
     path('api/dashboard/', include('dashboard.urls')),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media is never served publicly; scan files are downloaded through
+# /api/scans/{id}/files/{key}/, which checks ownership first.
\ No newline at end of file
@@ -4,6 +4,12 @@ set -e
 # Activate venv
 . /opt/venv/bin/activate
 
+# Services that pass their own command (celery, inference server) run it
+# instead of the web start-up below.
+if [ "$#" -gt 0 ]; then
+    exec "$@"
+fi
+
 # Run migrations
 python manage.py migrate --no-input
 
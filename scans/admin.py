@@ -31,14 +31,17 @@ class ScanAdmin(admin.ModelAdmin):
             )
         }),
         ('Output Files', {
-            'fields': ('processed_3d_model',)
+            'fields': ('processed_3d_model', 'model_variants', 'landmarks_file')
+        }),
+        ('Diagnostics', {
+            'fields': ('stage_timings', 'processing_attempts', 'reprocess_status', 'reprocess_failure_reason')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
         }),
     )
 
-    readonly_fields = ('id', 'user', 'created_at', 'updated_at', 'processed_3d_model', 'failure_reason') + \
+    readonly_fields = ('id', 'user', 'created_at', 'updated_at', 'processed_3d_model', 'model_variants', 'landmarks_file', 'failure_reason', 'stage_timings', 'processing_attempts', 'reprocess_status', 'reprocess_failure_reason') + \
                       tuple(f.name for f in Scan._meta.get_fields() if isinstance(f, models.DecimalField))
 
     def has_add_permission(self, request):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ScansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scans'
+
+    def ready(self):
+        # Connects the signal handlers that drop cached scan payloads on save.
+        from . import detail_cache  # noqa: F401
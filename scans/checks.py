@@ -0,0 +1,25 @@
+# scans/checks.py
+
+import sys
+from django.core.exceptions import ImproperlyConfigured
+
+# Modules that belong to the scan pipeline and must only ever be loaded by the
+# Celery workers. Each one costs the web process tens to hundreds of MB.
+ML_MODULES = ('cv2', 'mediapipe', 'trimesh', 'onnxruntime')
+
+
+def assert_ml_stack_not_loaded():
+    """
+    Imports the whole URLconf (and with it every view and serializer) and
+    fails start-up if that pulled any of the ML modules into the web process.
+    """
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+    loaded = [name for name in ML_MODULES if name in sys.modules]
+    if loaded:
+        raise ImproperlyConfigured(
+            f"The web process imported {', '.join(loaded)}. The scan pipeline must "
+            "only be imported inside Celery tasks; enqueue work through scans.tasks."
+        )
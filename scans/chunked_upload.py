@@ -0,0 +1,86 @@
+# scans/chunked_upload.py
+
+import fcntl
+import mimetypes
+import os
+import re
+import shutil
+from django.core.files.uploadedfile import UploadedFile
+
+# Bytes read from the request and written to disk at a time.
+COPY_BUFFER_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class ChunkError(ValueError):
+    """A chunk that cannot be appended; `received` is where the client should resume."""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+def parse_content_range(header: str, size: int) -> tuple:
+    """Returns (start, length) from a 'bytes start-end/total' Content-Range header."""
+    match = _CONTENT_RANGE.match(header or '')
+    if match is None:
+        raise ValueError("Content-Range must be of the form 'bytes start-end/total'.")
+    start, end, total = (int(group) for group in match.groups())
+    if total != size:
+        raise ValueError(f"This file was declared as {size} bytes, not {total}.")
+    if end < start or end >= size:
+        raise ValueError(f"The range {start}-{end} is outside the file's {size} bytes.")
+    return start, end - start + 1
+
+
+def append_chunk(path: str, stream, start: int, length: int) -> int:
+    """
+    Copies `length` bytes of `stream` onto the end of the file at `path`, which
+    must currently hold exactly `start` bytes, without holding more than
+    COPY_BUFFER_SIZE of it in memory. Returns the file's new size.
+
+    If the client disconnects part-way, the bytes that did arrive are kept, so
+    the retry only has to send the rest.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkError("Another chunk of this file is still being written.", start)
+
+        received = os.fstat(part.fileno()).st_size
+        if received != start:
+            raise ChunkError(f"Expected the chunk at byte {received}, not {start}.", received)
+
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            part.write(data)
+            remaining -= len(data)
+        part.flush()
+        return os.fstat(part.fileno()).st_size
+
+
+class StagedUpload(UploadedFile):
+    """
+    A fully received chunked upload, handed to ScanCreateSerializer like a
+    regular upload. Like Django's TemporaryUploadedFile it exposes
+    temporary_file_path(), so the storage moves the file into place instead
+    of copying it.
+    """
+
+    def __init__(self, path: str, name: str):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        super().__init__(open(path, 'rb'), name, content_type, os.path.getsize(path))
+        self._path = path
+
+    def temporary_file_path(self) -> str:
+        return self._path
+
+
+def discard_staging_dir(path: str):
+    shutil.rmtree(path, ignore_errors=True)
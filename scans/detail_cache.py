@@ -0,0 +1,52 @@
+# scans/detail_cache.py
+
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Scan
+
+# Serialized GET /api/scans/{id}/ payloads of finished scans, which clients
+# re-open far more often than they change. Each entry carries the ETag it was
+# built for, so writes that bypass save() (queryset .update() calls, which
+# bump updated_at themselves) can never serve a stale payload; saves and
+# deletes also drop the entry outright.
+CACHED_STATUSES = (Scan.Status.COMPLETED, Scan.Status.FAILED)
+
+
+def scan_etag(updated_at, status: str, owner_name: str) -> str:
+    # The detail shows the owner's name, which changes without touching the scan.
+    return '"%s"' % hashlib.md5(f"{updated_at.isoformat()}|{status}|{owner_name}".encode()).hexdigest()
+
+
+def _key(scan_id) -> str:
+    return f"scans:detail:{scan_id}"
+
+
+def get_cached_detail(scan_id, etag: str):
+    try:
+        entry = caches['scans'].get(_key(scan_id))
+    except Exception as e:
+        # A cache outage only costs the query and serialization.
+        print(f"Warning: Could not read the cached scan {scan_id}: {e}")
+        return None
+    if entry is not None and entry['etag'] == etag:
+        return entry['data']
+    return None
+
+
+def cache_detail(scan_id, etag: str, data: dict):
+    try:
+        caches['scans'].set(_key(scan_id), {'etag': etag, 'data': data}, settings.SCAN_DETAIL_CACHE_SECONDS)
+    except Exception as e:
+        print(f"Warning: Could not cache scan {scan_id}: {e}")
+
+
+@receiver(post_save, sender=Scan)
+@receiver(post_delete, sender=Scan)
+def invalidate_detail(sender, instance, **kwargs):
+    try:
+        caches['scans'].delete(_key(instance.pk))
+    except Exception as e:
+        print(f"Warning: Could not invalidate the cached scan {instance.pk}: {e}")
@@ -0,0 +1,63 @@
+# scans/downloads.py
+
+import mimetypes
+import os
+from urllib.parse import quote, urlsplit
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+from .processing.artifacts import content_digest
+
+# File keys of GET /api/scans/{id}/files/{key}/: the four photos, the OBJ and
+# '<variant>-<file_type>' for each exported binary mesh (e.g. 'preview-glb').
+IMAGE_KEYS = ('front', 'back', 'left', 'right')
+MODEL_KEY = 'model'
+
+CONTENT_TYPES = {'.glb': 'model/gltf-binary', '.ply': 'application/ply', '.obj': 'model/obj'}
+
+
+def scan_file_name(scan, file_key: str):
+    """The storage name of one of the scan's files, or None if it has no such file."""
+    if file_key in IMAGE_KEYS:
+        return getattr(scan, f'image_{file_key}').name or None
+    if file_key == MODEL_KEY:
+        return scan.processed_3d_model.name or None
+    variant, _, file_type = file_key.partition('-')
+    exported = scan.model_variants.get(variant, {}).get(file_type)
+    return exported['name'] if exported else None
+
+
+def _internal_uri(name: str) -> str:
+    if isinstance(default_storage, FileSystemStorage):
+        return settings.SCAN_MEDIA_INTERNAL_PREFIX + quote(name)
+    # Object storage: nginx fetches the object itself with a presigned URL,
+    # so the bucket stays private.
+    url = urlsplit(default_storage.url(name))
+    return f"{settings.SCAN_STORAGE_INTERNAL_PREFIX}{url.path.lstrip('/')}?{url.query}"
+
+
+def protected_file_response(name: str, filename: str) -> HttpResponse:
+    """
+    Answers a download the caller is already allowed to make. With
+    SCAN_MEDIA_X_ACCEL the body is left to nginx (X-Accel-Redirect to an
+    internal location), which also handles Range requests, so no web worker
+    is held for the transfer; otherwise Django streams the file itself.
+    """
+    if settings.SCAN_MEDIA_X_ACCEL:
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = _internal_uri(name)
+    else:
+        response = FileResponse(default_storage.open(name, 'rb'))
+
+    extension = os.path.splitext(name)[1].lower()
+    response['Content-Type'] = CONTENT_TYPES.get(extension) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    if content_digest(name):
+        # Content-addressed photos never change under their name.
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        # Meshes are rewritten when a scan is reprocessed; revalidate against
+        # the ETag/Last-Modified nginx sends.
+        response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,55 @@
+# scans/events.py
+
+import json
+import threading
+from django.conf import settings
+import redis
+
+# Scan status and stage-progress events go out on one Redis pub/sub channel per
+# user. The Celery tasks publish them; the /api/scans/events/ stream relays
+# them to that user's open connections.
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# The Scan fields scan_event() reads; load at least these with .only().
+EVENT_FIELDS = ('id', 'user_id', 'status', 'failure_reason', 'reprocess_status', 'reprocess_failure_reason')
+
+
+def user_channel(user_id) -> str:
+    return f"scan-events:user:{user_id}"
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    settings.SCAN_EVENTS_REDIS_URL, socket_connect_timeout=2, socket_timeout=2)
+    return _client
+
+
+def scan_event(scan, event: str, **data) -> dict:
+    payload = {'event': event, 'scan': str(scan.id), 'status': scan.status}
+    if scan.status == scan.Status.FAILED:
+        payload['failure_reason'] = scan.failure_reason
+    if scan.reprocess_status:
+        payload['reprocess_status'] = scan.reprocess_status
+        if scan.reprocess_status == scan.Status.FAILED:
+            payload['reprocess_failure_reason'] = scan.reprocess_failure_reason
+    payload.update(data)
+    return payload
+
+
+def publish_scan_event(scan, event: str, **data):
+    """
+    Publishes an event about `scan` to its owner's channel. Events are a
+    convenience for clients, so a Redis outage only logs a warning and never
+    fails the task that published it.
+    """
+    try:
+        _get_client().publish(user_channel(scan.user_id), json.dumps(scan_event(scan, event, **data)))
+    except redis.RedisError as e:
+        print(f"Warning: Could not publish the '{event}' event of scan {scan.id}: {e}")
@@ -0,0 +1,104 @@
+# scans/management/commands/quantize_gender_model.py
+
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Quantizes an FP32 ONNX export of the Caffe gender net to INT8 for the 'onnx' gender "
+        "backend, then checks its predictions against the cv2.dnn Caffe model. The FP32 export "
+        "itself is produced offline from gender_net.caffemodel with a Caffe-to-ONNX converter."
+    )
+
+    def add_arguments(self, parser):
+        gender_model_dir = settings.AI_MODELS_DIR / 'gender_detection'
+        parser.add_argument('--source', default=str(gender_model_dir / 'gender_net.onnx'),
+                            help="FP32 ONNX export of the gender net.")
+        parser.add_argument('--output', default=settings.SCAN_GENDER_ONNX_MODEL)
+        parser.add_argument('--max-images', type=int, default=200,
+                            help="Number of recent scans whose front-view face crops are used for "
+                                 "calibration and the parity check.")
+        parser.add_argument('--mode', choices=('static', 'dynamic'), default='static',
+                            help="static calibrates activations on the face crops; dynamic only quantizes weights.")
+        parser.add_argument('--min-agreement', type=float, default=0.98,
+                            help="Fail if fewer predictions than this match the cv2.dnn model.")
+
+    def handle(self, *args, **options):
+        import cv2
+        import numpy as np
+        import onnxruntime as ort
+        try:
+            from onnxruntime.quantization import (
+                CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static)
+        except ImportError as e:
+            # The quantizer needs the onnx package, which the serving image does
+            # not ship; this is a one-off build step.
+            raise CommandError(f"Quantization needs the onnx package (pip install onnx): {e}")
+        from scans.processing.gender_predictor import GENDER_INPUT_SIZE, gender_blob
+        from scans.processing.inference_backends import OnnxGenderBackend, OpenCVGenderBackend
+
+        source, output = options['source'], options['output']
+        if not os.path.exists(source):
+            raise CommandError(f"No FP32 ONNX model at {source}.")
+
+        faces = [cv2.resize(face, GENDER_INPUT_SIZE) for face in self.face_crops(options['max_images'])]
+        if not faces:
+            raise CommandError("No stored front view with a detectable face to calibrate on.")
+        blob = gender_blob(faces)
+
+        if options['mode'] == 'static':
+            input_name = ort.InferenceSession(source, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+            class FaceCalibrationReader(CalibrationDataReader):
+                def __init__(self):
+                    self._items = iter({input_name: blob[i:i + 1]} for i in range(len(blob)))
+
+                def get_next(self):
+                    return next(self._items, None)
+
+            quantize_static(source, output, FaceCalibrationReader(), quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        else:
+            quantize_dynamic(source, output, weight_type=QuantType.QInt8)
+        self.stdout.write(f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB, "
+                          f"source {os.path.getsize(source) / 1e6:.1f} MB).")
+
+        reference = np.concatenate([OpenCVGenderBackend().predict(blob[i:i + 1]) for i in range(len(blob))])
+        candidate = np.concatenate([OnnxGenderBackend(output).predict(blob[i:i + 1]) for i in range(len(blob))])
+        reference, candidate = reference.reshape(len(blob), -1), candidate.reshape(len(blob), -1)
+        agreement = float((reference.argmax(axis=1) == candidate.argmax(axis=1)).mean())
+        max_difference = float(np.abs(reference - candidate).max())
+        self.stdout.write(f"Parity on {len(blob)} images: {agreement:.1%} same prediction, "
+                          f"max score difference {max_difference:.4f}.")
+
+        if agreement < options['min_agreement']:
+            raise CommandError(f"Only {agreement:.1%} of predictions match cv2.dnn "
+                               f"(need {options['min_agreement']:.1%}); keep the 'opencv' backend.")
+        self.stdout.write(self.style.SUCCESS("Set SCAN_GENDER_BACKEND=onnx to use the quantized model."))
+
+    def face_crops(self, limit):
+        """
+        Yields up to `limit` padded face crops of stored front views, cut the
+        same way the pipeline cuts the gender net's input.
+        """
+        from scans.models import Scan
+        from scans.processing.context import ScanContext
+        from scans.processing.face_detection import find_face_roi
+
+        found = 0
+        for scan in Scan.objects.exclude(image_front='').order_by('-created_at').iterator():
+            if found >= limit:
+                return
+            context = ScanContext(str(scan.id), {'front': scan.image_front.name})
+            try:
+                face_roi = find_face_roi(context, 'front')
+                if face_roi is None:
+                    continue
+                face = context.downscaled('front', settings.SCAN_MAX_IMAGE_EDGE, box=face_roi.box)
+            except Exception as e:
+                self.stderr.write(f"Warning: Skipping scan {scan.id}: {e}")
+                continue
+            found += 1
+            yield face
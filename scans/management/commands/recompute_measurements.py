@@ -0,0 +1,42 @@
+# scans/management/commands/recompute_measurements.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from scans.models import Scan
+from scans.processing.recompute import recompute_measurements
+
+
+class Command(BaseCommand):
+    help = "Regenerates scan measurements from the stored landmarks, without re-running inference."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scan_ids', nargs='*', help="Only recompute these scans (default: all with stored landmarks).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = (Scan.objects
+                    .filter(status=Scan.Status.COMPLETED)
+                    .exclude(landmarks_file='')
+                    .exclude(landmarks_file__isnull=True)
+                    .order_by('created_at'))
+        if options['scan_ids']:
+            queryset = queryset.filter(id__in=options['scan_ids'])
+
+        updated, skipped = 0, 0
+        batch_size = options['batch_size']
+        scans = list(queryset.only('id', 'landmarks_file', 'updated_at', *Scan.MEASUREMENT_FIELDS))
+        for offset in range(0, len(scans), batch_size):
+            changed = []
+            for scan, measurements in recompute_measurements(scans[offset:offset + batch_size]):
+                if measurements is None:
+                    skipped += 1
+                    continue
+                scan.set_measurements_mm(measurements)
+                # bulk_update() skips auto_now; the new updated_at changes the scan's ETag.
+                scan.updated_at = timezone.now()
+                changed.append(scan)
+            Scan.objects.bulk_update(changed, Scan.MEASUREMENT_FIELDS + ('updated_at',))
+            updated += len(changed)
+            self.stdout.write(f"Recomputed {updated} scans...")
+
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {updated} scans, skipped {skipped} without a usable face."))
@@ -0,0 +1,37 @@
+# scans/management/commands/reprocess_scans.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from scans.models import Scan
+from scans.processing.checkpoints import clear_checkpoints
+from scans.tasks import reprocess_scan_task
+
+
+class Command(BaseCommand):
+    help = (
+        "Queues scans for a full pipeline re-run on the 'scans_bulk' queue. By default this "
+        "takes every completed scan processed by an older SCAN_PIPELINE_VERSION."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scan_ids', nargs='*', help="Only reprocess these scans.")
+        parser.add_argument('--status', choices=Scan.Status.values, default=Scan.Status.COMPLETED)
+        parser.add_argument('--all-versions', action='store_true',
+                            help="Include scans already processed by the current pipeline version.")
+
+    def handle(self, *args, **options):
+        queryset = Scan.objects.filter(status=options['status'])
+        if not options['all_versions']:
+            queryset = queryset.exclude(pipeline_version=settings.SCAN_PIPELINE_VERSION)
+        if options['scan_ids']:
+            queryset = queryset.filter(id__in=options['scan_ids'])
+
+        scan_ids = list(queryset.order_by('created_at').values_list('id', flat=True))
+        # Each run starts from scratch with a fresh crash budget (see
+        # SCAN_TASK_MAX_ATTEMPTS) instead of resuming an earlier run's checkpoints.
+        Scan.objects.filter(id__in=scan_ids).update(processing_attempts=0)
+        for scan_id in scan_ids:
+            clear_checkpoints(str(scan_id))
+            reprocess_scan_task.delay(str(scan_id))
+
+        self.stdout.write(self.style.SUCCESS(f"Queued {len(scan_ids)} scans for reprocessing."))
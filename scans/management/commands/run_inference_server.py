@@ -0,0 +1,35 @@
+# scans/management/commands/run_inference_server.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Runs the host-local inference server that batches gender/FaceMesh requests from all Celery workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.SCAN_INFERENCE_SOCKET)
+        parser.add_argument('--window-ms', type=float, default=settings.SCAN_INFERENCE_BATCH_WINDOW_MS)
+        parser.add_argument('--max-batch', type=int, default=settings.SCAN_INFERENCE_MAX_BATCH)
+        parser.add_argument('--face-mesh-threads', type=int, default=settings.SCAN_INFERENCE_FACE_MESH_THREADS)
+
+    def handle(self, *args, **options):
+        from scans.processing.inference_server import InferenceServer
+        from scans.processing.model_registry import registry
+
+        if not options['socket']:
+            raise CommandError("Set SCAN_INFERENCE_SOCKET or pass --socket.")
+
+        registry.warm_up(['gender_net'])
+        server = InferenceServer(
+            options['socket'],
+            window_seconds=options['window_ms'] / 1000.0,
+            max_batch=options['max_batch'],
+            face_mesh_threads=options['face_mesh_threads'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Inference server listening on {options['socket']}"))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            registry.close()
@@ -1,7 +1,9 @@
 # scans/models.py
 
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+import os
 import uuid
 
 class Scan(models.Model):
@@ -25,7 +27,27 @@ class Scan(models.Model):
     # --- Processing & Outputs ---
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PROCESSING)
     failure_reason = models.TextField(null=True, blank=True)
+    # SHA-256 over the four input images only, used to reuse the results of an
+    # identical completed scan (see find_completed_duplicate). The pipeline
+    # version is matched separately, so the digest stays valid across reprocessing.
+    input_digest = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # The pipeline version that produced the scan's current results.
+    pipeline_version = models.CharField(max_length=32, null=True, blank=True)
+    reused_from = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='reused_by')
     processed_3d_model = models.FileField(upload_to='scans/outputs/', null=True, blank=True)
+    # Binary exports per level of detail: {'full'|'preview': {'glb'|'ply': {'name', 'size', 'faces'}}}
+    model_variants = models.JSONField(default=dict, blank=True)
+    # FaceMesh landmarks of every view (float32 .npz), so measurements can be recomputed without inference.
+    landmarks_file = models.FileField(upload_to='scans/landmarks/', null=True, blank=True)
+    # Per-stage wall/CPU time and RSS of the last pipeline run (see scans/processing/stages.py).
+    stage_timings = models.JSONField(null=True, blank=True)
+    # Runs started for this scan; a worker crash redelivers the task (acks_late), up to SCAN_TASK_MAX_ATTEMPTS.
+    processing_attempts = models.PositiveSmallIntegerField(default=0)
+    # A re-run of a scan that already completed (see reprocess_scans) is tracked
+    # here instead of in status, so the scan keeps serving its results until the
+    # re-run succeeds. None when the scan has never been re-run.
+    reprocess_status = models.CharField(max_length=20, choices=Status.choices, null=True, blank=True)
+    reprocess_failure_reason = models.TextField(null=True, blank=True)
     
     # --- ALL MEASUREMENTS STORED IN THE BACKEND (in cm) ---
 
@@ -58,8 +80,112 @@ class Scan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    IMAGE_FIELDS = ('image_front', 'image_back', 'image_left', 'image_right')
+    MEASUREMENT_FIELDS = (
+        'eye_to_eye', 'ear_to_ear', 'head_width', 'head_height', 'head_length',
+        'head_circumference_A', 'forehead_to_back_B', 'cross_measurement_C', 'under_chin_D',
+        'eyebrow_to_earlobe_E', 'eye_corner_to_ear_F', 'ear_height_G', 'ear_width_H',
+        'cheek_guard_clearance_L', 'cheek_guard_height_M', 'cheek_guard_width_N',
+    )
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Serves the paginated scan list (user's scans by created_at, id)
+            # straight from the index, without sorting.
+            models.Index(fields=['user', '-created_at', '-id'], name='scan_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Scan '{self.name}' for {self.user.username}"
+
+    def find_completed_duplicate(self):
+        """
+        Returns a completed scan with the same four input images whose
+        results come from the current pipeline version, or None.
+        """
+        if not self.input_digest:
+            return None
+        return (Scan.objects
+                .filter(input_digest=self.input_digest, pipeline_version=settings.SCAN_PIPELINE_VERSION,
+                        status=Scan.Status.COMPLETED)
+                .exclude(pk=self.pk)
+                .order_by('-created_at')
+                .first())
+
+    def set_measurements_mm(self, measurements: dict):
+        """Stores pipeline measurements (mm) on the measurement fields (cm)."""
+        for key, value in measurements.items():
+            if key in self.MEASUREMENT_FIELDS:
+                setattr(self, key, float(value) / 10.0)
+
+    def _copy_output(self, other, name: str) -> str:
+        """Stores a copy of one of `other`'s output files under this scan's id."""
+        from .processing.artifacts import read_artifact, write_artifact
+
+        directory, filename = os.path.split(name)
+        if str(other.id) in filename:
+            filename = filename.replace(str(other.id), str(self.id), 1)
+        else:
+            filename = f"{self.id}_{filename}"
+        return write_artifact(f"{directory}/{filename}", read_artifact(name))
+
+    def copy_results_from(self, other):
+        """
+        Takes over the measurements of another completed scan, with copies of
+        its output files, so reprocessing or deleting either scan never
+        touches the other's files.
+        """
+        for field in self.MEASUREMENT_FIELDS:
+            setattr(self, field, getattr(other, field))
+        if other.processed_3d_model:
+            self.processed_3d_model.name = self._copy_output(other, other.processed_3d_model.name)
+        if other.landmarks_file:
+            self.landmarks_file.name = self._copy_output(other, other.landmarks_file.name)
+        if other.model_variants:
+            self.model_variants = {
+                variant: {file_format: {**details, 'name': self._copy_output(other, details['name'])}
+                          for file_format, details in formats.items()}
+                for variant, formats in other.model_variants.items()
+            }
+        self.pipeline_version = other.pipeline_version
+        self.reused_from = other
+        self.status = Scan.Status.COMPLETED
+
+
+class ScanUpload(models.Model):
+    """
+    A resumable upload of a scan's four photos, sent in byte ranges.
+
+    The client declares each photo's name and size when opening the session.
+    The chunks are appended to one file per view under SCAN_UPLOAD_DIR, and
+    the size of that file is the only record of progress, so a resumed upload
+    carries on from whatever reached the disk. Finalizing turns the session
+    into a Scan.
+    """
+    VIEWS = ('front', 'back', 'left', 'right')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_uploads')
+    # {view: {'name': original file name, 'size': bytes}}
+    files = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Scan '{self.name}' for {self.user.username}"
\ No newline at end of file
+        return f"Upload {self.id} for {self.user.username}"
+
+    @property
+    def staging_dir(self) -> str:
+        return os.path.join(settings.SCAN_UPLOAD_DIR, str(self.id))
+
+    def part_path(self, view: str) -> str:
+        return os.path.join(self.staging_dir, f'{view}.part')
+
+    def received(self, view: str) -> int:
+        try:
+            return os.path.getsize(self.part_path(view))
+        except FileNotFoundError:
+            return 0
+
+    def is_complete(self) -> bool:
+        return all(self.received(view) == self.files[view]['size'] for view in self.VIEWS)
@@ -0,0 +1,93 @@
+# scans/pagination.py
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class ScanCursorPagination(CursorPagination):
+    """
+    Pages a user's scans newest first. The cursor encodes a position in the
+    (user, created_at, id) index instead of an offset, so every page costs
+    the same however long the history is.
+
+    DRF's cursor only records the first ordering field and falls back to an
+    offset among equal values, which drifts when scans are created while a
+    client pages. The position here is the (created_at, id) pair itself, so
+    it is unique and scans created in the same instant are paged by id.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.SCAN_LIST_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.SCAN_LIST_MAX_PAGE_SIZE
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f"{instance.created_at.isoformat()}|{instance.id}"
+
+    def _position_filter(self, position: str, before: bool) -> Q:
+        """Rows before (or after) `position` in the list's newest-first order."""
+        created_at, _, pk = position.partition('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not pk:
+            raise NotFound(self.invalid_cursor_message)
+        if before:
+            return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # DRF's implementation, with the (created_at, id) keyset filter in
+        # place of its single-field one.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._position_filter(current_position, before=reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
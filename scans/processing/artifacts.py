@@ -0,0 +1,125 @@
+# scans/processing/artifacts.py
+
+import hashlib
+import os
+import re
+import threading
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Uploaded photos are stored content-addressed (scans/inputs/<sha256><ext>, see
+# scans/serializers.py), so their names already carry the cache key.
+_CONTENT_ADDRESSED = re.compile(r'^([0-9a-f]{64})(\.\w+)?$')
+
+
+def content_digest(name: str):
+    """The SHA-256 a content-addressed storage name was derived from, or None."""
+    match = _CONTENT_ADDRESSED.match(os.path.basename(name))
+    return match.group(1) if match else None
+
+
+class ArtifactCache:
+    """
+    A size-bounded, least-recently-used cache of stored artifacts on the
+    worker's local disk, keyed by content hash.
+
+    Every worker process on a node shares the directory. Entries are written
+    atomically and never change, since the key is the hash of the content.
+    A hit touches the entry's mtime, and the oldest entries are evicted once
+    the directory grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def get(self, digest: str):
+        path = self._path(digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, digest: str, data: bytes):
+        if hashlib.sha256(data).hexdigest() != digest:
+            print(f"Warning: Stored artifact {digest} does not match its hash; not caching it.")
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(digest)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(digest))
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+cache = ArtifactCache(settings.SCAN_ARTIFACT_CACHE_DIR, settings.SCAN_ARTIFACT_CACHE_MAX_MB * 1024 * 1024)
+
+
+def read_artifact(name: str) -> bytes:
+    """
+    Reads a stored file through the default storage into memory. Content-
+    addressed files are served from the local cache when possible, so a
+    retried scan does not download its photos again.
+    """
+    digest = content_digest(name)
+    if digest is not None:
+        data = cache.get(digest)
+        if data is not None:
+            return data
+    with default_storage.open(name, 'rb') as f:
+        data = f.read()
+    if digest is not None:
+        cache.put(digest, data)
+    return data
+
+
+def write_artifact(name: str, data: bytes) -> str:
+    """Stores `data` under exactly `name` through the default storage, replacing any previous file."""
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    saved = default_storage.save(name, ContentFile(data))
+    if saved != name:
+        # Another writer recreated the file in between; ours went under a new name.
+        print(f"Warning: '{name}' was stored as '{saved}'.")
+    return saved
+
+
+def delete_artifacts(directory: str):
+    """Deletes every file stored under `directory`."""
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        default_storage.delete(f"{directory}/{filename}")
+    # Removes the emptied directory itself on filesystem storage.
+    default_storage.delete(directory)
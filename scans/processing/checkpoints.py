@@ -0,0 +1,69 @@
+# scans/processing/checkpoints.py
+
+from contextlib import contextmanager
+import io
+import json
+from typing import Optional
+import zipfile
+from django.core.files.storage import default_storage
+import numpy as np
+from .artifacts import delete_artifacts, write_artifact
+
+# Checkpoints live in the default storage, so the task that resumes a scan
+# (or finishes it) may run on a different node from the one that wrote them.
+
+
+def checkpoint_dir(scan_id: str) -> str:
+    return f"scans/checkpoints/{scan_id}"
+
+
+def save_checkpoint(scan_id: str, name: str, meta: dict, arrays: dict = None):
+    """Stores a finished step's JSON-safe `meta` and its numpy `arrays` as one .npz."""
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.array(json.dumps(meta)), **(arrays or {}))
+    write_artifact(f"{checkpoint_dir(scan_id)}/{name}.npz", buffer.getvalue())
+
+
+def load_checkpoint(scan_id: str, name: str) -> Optional[tuple]:
+    """Returns (meta, {name: array}) of a stored step, or None if it has not finished."""
+    path = f"{checkpoint_dir(scan_id)}/{name}.npz"
+    if not default_storage.exists(path):
+        return None
+    try:
+        with default_storage.open(path, 'rb') as f:
+            with np.load(io.BytesIO(f.read())) as data:
+                meta = json.loads(str(data['meta']))
+                arrays = {key: data[key] for key in data.files if key != 'meta'}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile) as e:
+        # Half written by a worker that died while saving it; redo the step.
+        print(f"Warning: Ignoring unreadable checkpoint '{path}': {e}")
+        return None
+    return meta, arrays
+
+
+def clear_checkpoints(scan_id: str):
+    delete_artifacts(checkpoint_dir(scan_id))
+
+
+@contextmanager
+def crash_guard(scan_id: str, name: str, max_attempts: int):
+    """
+    Counts runs of step `name` that ended with the worker dying.
+
+    A marker is written on entry and removed on any Python-level exit, so a
+    marker found on entry means the last run was killed (OOM, hard time
+    limit) and its task redelivered. After `max_attempts` such runs the step
+    raises instead of taking down another worker.
+    """
+    marker = f"{checkpoint_dir(scan_id)}/{name}.running"
+    attempts = 1
+    if default_storage.exists(marker):
+        with default_storage.open(marker, 'rb') as f:
+            attempts = int(f.read() or 0) + 1
+    if attempts > max_attempts:
+        raise RuntimeError(f"Processing was interrupted {attempts - 1} times during '{name}'; giving up on this scan.")
+    write_artifact(marker, str(attempts).encode())
+    try:
+        yield
+    finally:
+        default_storage.delete(marker)
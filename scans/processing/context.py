@@ -0,0 +1,82 @@
+# scans/processing/context.py
+
+import cv2
+import numpy as np
+from .artifacts import read_artifact
+
+# The four photos every scan is uploaded with, in the order the pipeline uses.
+VIEWS = ('front', 'back', 'left', 'right')
+
+
+class ScanContext:
+    """
+    Shared state for one run of the scan pipeline.
+
+    Each uploaded view is fetched through the default storage (so any worker
+    can run any scan) and decoded in memory at most once; the BGR frame, its
+    RGB conversion and any downscaled copies are cached here and handed to
+    every stage. Cached arrays are read-only so one stage cannot corrupt
+    another's input.
+    """
+
+    def __init__(self, scan_id: str, image_names: dict):
+        self.scan_id = scan_id
+        # {view: storage name}
+        self.image_names = image_names
+        self._cache = {}
+
+    @classmethod
+    def from_scan(cls, scan):
+        image_names = {}
+        for view in VIEWS:
+            image_field = getattr(scan, f'image_{view}')
+            if image_field:
+                image_names[view] = image_field.name
+        return cls(str(scan.id), image_names)
+
+    @property
+    def views(self):
+        return tuple(view for view in VIEWS if view in self.image_names)
+
+    def cached(self, key, build):
+        """Builds a per-scan derivative once and keeps it under `key`."""
+        if key not in self._cache:
+            value = build()
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            self._cache[key] = value
+        return self._cache[key]
+
+    def bgr(self, view: str) -> np.ndarray:
+        def decode():
+            data = np.frombuffer(read_artifact(self.image_names[view]), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if image is None:
+                raise IOError(f"The {view} image could not be read.")
+            return image
+        return self.cached(('bgr', view), decode)
+
+    def rgb(self, view: str) -> np.ndarray:
+        return self.cached(('rgb', view), lambda: cv2.cvtColor(self.bgr(view), cv2.COLOR_BGR2RGB))
+
+    def shape(self, view: str):
+        """(height, width) of the original frame."""
+        return self.bgr(view).shape[:2]
+
+    def downscaled(self, view: str, max_edge: int, color: str = 'bgr', box=None) -> np.ndarray:
+        """
+        The view (or the (x0, y0, x1, y1) `box` cut from it) shrunk so its
+        longest edge is at most `max_edge` pixels.
+        """
+        def build():
+            image = self.rgb(view) if color == 'rgb' else self.bgr(view)
+            if box is not None:
+                x0, y0, x1, y1 = box
+                image = image[y0:y1, x0:x1]
+            height, width = image.shape[:2]
+            scale = max_edge / max(height, width)
+            if scale >= 1.0:
+                return image
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return self.cached(('downscaled', view, max_edge, color, box), build)
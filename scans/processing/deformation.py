@@ -0,0 +1,103 @@
+# scans/processing/deformation.py
+
+import json
+from pathlib import Path
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+# Base heads are modelled Y-up, facing +Z, with +X on the viewer's right.
+
+# FaceMesh landmarks the base heads are anchored at, with where each sits on an
+# average head as fractions of the base head's bounding box (x: -X to +X,
+# y: bottom to top, z: back to front). Used to find the anchor vertices of a
+# base head that ships without a <name>.anchors.json listing them.
+CANONICAL_ANCHORS = {
+    1: (0.50, 0.42, 1.00),    # nose tip
+    10: (0.50, 0.78, 0.88),   # top of the forehead
+    152: (0.50, 0.05, 0.85),  # bottom of the chin
+    468: (0.33, 0.55, 0.90),  # pupil
+    473: (0.67, 0.55, 0.90),  # pupil
+    227: (0.10, 0.50, 0.70),  # cheek
+    447: (0.90, 0.50, 0.70),  # cheek
+    234: (0.00, 0.45, 0.50),  # ear tragus
+    454: (1.00, 0.45, 0.50),  # ear tragus
+}
+
+
+def graph_laplacian(vertex_count: int, faces: np.ndarray) -> sparse.csr_matrix:
+    """Uniform (umbrella) Laplacian of the mesh's edge graph."""
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    adjacency = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(vertex_count, vertex_count))
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    return (sparse.diags(degree) - adjacency).tocsr()
+
+
+def load_anchors(source: Path, vertices: np.ndarray) -> dict:
+    """
+    {landmark index: vertex id} for the base head OBJ at `source`: read from
+    <name>.anchors.json next to it when present, otherwise the vertex closest
+    to each CANONICAL_ANCHORS position. Landmarks that would share a vertex
+    keep only the first.
+    """
+    anchors_path = source.with_name(f"{source.stem}.anchors.json")
+    if anchors_path.exists():
+        with open(anchors_path) as f:
+            return {int(landmark): int(vertex) for landmark, vertex in json.load(f).items()}
+
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    anchors = {}
+    for landmark, fractions in CANONICAL_ANCHORS.items():
+        position = low + np.asarray(fractions) * (high - low)
+        vertex = int(np.argmin(np.linalg.norm(vertices - position, axis=1)))
+        if vertex not in anchors.values():
+            anchors[landmark] = vertex
+    return anchors
+
+
+class LandmarkDeformer:
+    """
+    Landmark-anchored deformation of one base head.
+
+    The anchor vertices are moved exactly onto their targets, and the
+    displacement d of every other vertex minimises ||L d||^2, where L is the
+    mesh Laplacian, so the rest of the surface follows smoothly. The anchor
+    set is fixed per base head, so the system over the free vertices is
+    LU-factorised once when the deformer is built and every scan only
+    back-substitutes.
+    """
+
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray, anchors: dict, regularization: float = 1e-8):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        # Landmark indices and their vertex ids, in the same order.
+        self.landmarks = np.array(list(anchors), dtype=np.intp)
+        self.anchor_vertices = np.array(list(anchors.values()), dtype=np.intp)
+
+        vertex_count = len(self.vertices)
+        free = np.ones(vertex_count, dtype=bool)
+        free[self.anchor_vertices] = False
+        self.free_vertices = np.flatnonzero(free)
+
+        laplacian = graph_laplacian(vertex_count, np.asarray(faces))
+        bilaplacian = (laplacian.T @ laplacian).tocsr()
+        free_rows = bilaplacian[self.free_vertices]
+        self._coupling = free_rows[:, self.anchor_vertices].tocsr()
+        # The small identity term keeps the system definite for parts of the
+        # mesh (e.g. separate eye shells) that carry no anchor; they stay put.
+        system = free_rows[:, self.free_vertices] + sparse.identity(len(self.free_vertices)) * regularization
+        self._factor = splu(system.tocsc())
+
+    @property
+    def anchor_positions(self) -> np.ndarray:
+        return self.vertices[self.anchor_vertices]
+
+    def deform(self, targets: np.ndarray) -> np.ndarray:
+        """New vertex positions with the anchors at `targets` ((k, 3), in `landmarks` order)."""
+        anchor_displacement = np.asarray(targets, dtype=np.float64) - self.anchor_positions
+        displacement = np.zeros_like(self.vertices)
+        displacement[self.anchor_vertices] = anchor_displacement
+        displacement[self.free_vertices] = self._factor.solve(-(self._coupling @ anchor_displacement))
+        return self.vertices + displacement
@@ -0,0 +1,155 @@
+# scans/processing/export.py
+
+import json
+import struct
+from django.conf import settings
+import numpy as np
+import trimesh
+from .artifacts import write_artifact
+
+# Binary formats written for every level of detail, next to the legacy OBJ.
+BINARY_FORMATS = {
+    'glb': {'file_type': 'glb'},
+    'ply': {'file_type': 'ply', 'encoding': 'binary'},
+}
+
+# glTF component types and buffer view targets.
+_UNSIGNED_SHORT = 5123
+_UNSIGNED_INT = 5125
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+
+
+def quantize_vertices(vertices: np.ndarray, bits: int):
+    """
+    Maps vertices onto a 2**bits integer grid spanning the mesh's bounding box.
+
+    Returns (uint16 grid coordinates, offset, scale), where
+    vertices ~= grid * scale + offset. bits is capped at 16.
+    """
+    bits = min(bits, 16)
+    low = vertices.min(axis=0)
+    extent = np.ptp(vertices, axis=0)
+    extent[extent == 0] = 1.0
+    steps = (1 << bits) - 1
+    grid = np.round((vertices - low) / extent * steps).astype(np.uint16)
+    return grid, low, extent / steps
+
+
+def export_quantized_glb(mesh: trimesh.Trimesh, bits: int) -> bytes:
+    """
+    Writes a GLB whose positions are uint16 grid coordinates (KHR_mesh_quantization),
+    dequantized by the node's translation and scale. Indices are uint16 when
+    the mesh has few enough vertices.
+
+    Positions take 8 bytes per vertex instead of 12 (VEC3 attributes are padded
+    to a 4-byte stride), and uint16 indices halve the index buffer.
+    """
+    grid, offset, scale = quantize_vertices(np.asarray(mesh.vertices), bits)
+    faces = np.asarray(mesh.faces)
+
+    positions = np.zeros((len(grid), 4), dtype='<u2')
+    positions[:, :3] = grid
+    small = len(grid) <= 0xFFFF
+    indices = faces.astype('<u2' if small else '<u4').ravel()
+
+    index_bytes = indices.tobytes()
+    index_bytes += b'\0' * (-len(index_bytes) % 4)
+    position_bytes = positions.tobytes()
+    binary = index_bytes + position_bytes
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'benjaminkley'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{
+            'mesh': 0,
+            'translation': [float(value) for value in offset],
+            'scale': [float(value) for value in scale],
+        }],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 1}, 'indices': 0, 'mode': 4}]}],
+        'buffers': [{'byteLength': len(binary)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(indices) * indices.itemsize,
+             'target': _ELEMENT_ARRAY_BUFFER},
+            {'buffer': 0, 'byteOffset': len(index_bytes), 'byteLength': len(position_bytes),
+             'byteStride': 8, 'target': _ARRAY_BUFFER},
+        ],
+        'accessors': [
+            {'bufferView': 0, 'componentType': _UNSIGNED_SHORT if small else _UNSIGNED_INT,
+             'count': len(indices), 'type': 'SCALAR'},
+            {'bufferView': 1, 'componentType': _UNSIGNED_SHORT, 'count': len(grid), 'type': 'VEC3',
+             'min': grid.min(axis=0).tolist(), 'max': grid.max(axis=0).tolist()},
+        ],
+    }
+    json_bytes = json.dumps(gltf, separators=(',', ':')).encode()
+    json_bytes += b' ' * (-len(json_bytes) % 4)
+
+    length = 12 + 8 + len(json_bytes) + 8 + len(binary)
+    return b''.join([
+        struct.pack('<4sII', b'glTF', 2, length),
+        struct.pack('<I4s', len(json_bytes), b'JSON'), json_bytes,
+        struct.pack('<I4s', len(binary), b'BIN\0'), binary,
+    ])
+
+
+def decimate(mesh: trimesh.Trimesh, grid: int) -> trimesh.Trimesh:
+    """
+    Vertex-clustering decimation: vertices falling into the same cell of a
+    `grid`-cells-wide lattice are merged into their centroid, and faces that
+    collapse are dropped. Linear in the mesh size and needs no extra packages.
+    """
+    vertices = np.asarray(mesh.vertices)
+    faces = np.asarray(mesh.faces)
+    low = vertices.min(axis=0)
+    cell = max(np.ptp(vertices, axis=0).max(), 1e-9) / grid
+    cells = np.floor((vertices - low) / cell).astype(np.int64)
+    _, cluster, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.ravel()
+
+    merged = np.column_stack([np.bincount(cluster, weights=vertices[:, axis]) for axis in range(3)])
+    merged /= counts[:, None]
+
+    new_faces = cluster[faces]
+    keep = ((new_faces[:, 0] != new_faces[:, 1]) &
+            (new_faces[:, 1] != new_faces[:, 2]) &
+            (new_faces[:, 0] != new_faces[:, 2]))
+    new_faces = new_faces[keep]
+    _, unique_rows = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(unique_rows)]
+
+    decimated = trimesh.Trimesh(vertices=merged, faces=new_faces, process=False)
+    decimated.remove_unreferenced_vertices()
+    return decimated
+
+
+def export_model_variants(mesh: trimesh.Trimesh, scan_id: str) -> dict:
+    """
+    Stores the full mesh and a decimated preview as binary GLB and PLY under
+    scans/outputs/ in the default storage. With SCAN_MESH_QUANTIZATION_BITS set,
+    the GLB carries quantized positions; the PLY always keeps float32.
+
+    Returns {variant: {format: {'name', 'size', 'faces'}}} with storage names,
+    as stored on Scan.model_variants.
+    """
+    variants = {'full': mesh}
+    if settings.SCAN_MESH_PREVIEW_GRID:
+        variants['preview'] = decimate(mesh, settings.SCAN_MESH_PREVIEW_GRID)
+
+    exported = {}
+    for variant, variant_mesh in variants.items():
+        exported[variant] = {}
+        for file_format, export_options in BINARY_FORMATS.items():
+            filename = f"{scan_id}.{file_format}" if variant == 'full' else f"{scan_id}_{variant}.{file_format}"
+            if file_format == 'glb' and settings.SCAN_MESH_QUANTIZATION_BITS:
+                data = export_quantized_glb(variant_mesh, settings.SCAN_MESH_QUANTIZATION_BITS)
+            else:
+                data = variant_mesh.export(**export_options)
+            exported[variant][file_format] = {
+                'name': write_artifact(f"scans/outputs/{filename}", data),
+                'size': len(data),
+                'faces': len(variant_mesh.faces),
+            }
+    return exported
@@ -0,0 +1,76 @@
+# scans/processing/face_detection.py
+
+from dataclasses import dataclass
+from typing import Optional
+from django.conf import settings
+import cv2
+import numpy as np
+from .model_registry import registry
+
+# The res10 SSD was trained on 300x300 BGR input with these channel means.
+DETECTOR_INPUT_SIZE = (300, 300)
+DETECTOR_MEAN_VALUES = (104.0, 177.0, 123.0)
+
+
+@dataclass(frozen=True)
+class FaceROI:
+    """A padded face box in the ORIGINAL photo's pixel space."""
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    confidence: float
+
+    @property
+    def box(self):
+        return (self.x0, self.y0, self.x1, self.y1)
+
+
+def detect_face(image: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Runs the SSD on a BGR frame and returns the most confident face as a
+    normalised (x0, y0, x1, y1, confidence) row, or None below the threshold.
+    """
+    detector = registry.get('face_detector')
+    detector.setInput(cv2.dnn.blobFromImage(image, 1.0, DETECTOR_INPUT_SIZE, DETECTOR_MEAN_VALUES))
+    detections = detector.forward()[0, 0]
+    if len(detections) == 0:
+        return None
+    best = detections[detections[:, 2].argmax()]
+    if best[2] < settings.SCAN_FACE_DETECTION_CONFIDENCE:
+        return None
+    return np.array([best[3], best[4], best[5], best[6], best[2]], dtype=np.float32)
+
+
+def detect_view_face(context, view: str) -> Optional[np.ndarray]:
+    """detect_face() on a small copy of the view, run at most once per scan."""
+    return context.cached(
+        ('face', view), lambda: detect_face(context.downscaled(view, settings.SCAN_FACE_DETECTION_EDGE)))
+
+
+def find_face_roi(context, view: str) -> Optional[FaceROI]:
+    """
+    Finds the face on a small copy of the view and pads it by
+    SCAN_FACE_ROI_PADDING (a fraction of the box's size on each side), so the
+    crop keeps the ears and chin FaceMesh needs. Returns None when no face is
+    found or the detector is unavailable; callers then use the full frame.
+    """
+    try:
+        face = detect_view_face(context, view)
+    except Exception as e:
+        print(f"Warning: Face detection failed on the {view} view: {e}. Using the full frame.")
+        return None
+    if face is None:
+        return None
+
+    height, width = context.shape(view)
+    x0, y0, x1, y1 = np.clip(face[:4], 0.0, 1.0) * np.array([width, height, width, height])
+    if x1 - x0 < 1 or y1 - y0 < 1:
+        return None
+    pad_x = (x1 - x0) * settings.SCAN_FACE_ROI_PADDING
+    pad_y = (y1 - y0) * settings.SCAN_FACE_ROI_PADDING
+    return FaceROI(
+        x0=max(0, int(x0 - pad_x)), y0=max(0, int(y0 - pad_y)),
+        x1=min(width, int(np.ceil(x1 + pad_x))), y1=min(height, int(np.ceil(y1 + pad_y))),
+        confidence=round(float(face[4]), 3),
+    )
@@ -1,42 +1,49 @@
 # scans/processing/gender_predictor.py
 
-from django.conf import settings
 import cv2
+import numpy as np
+from .model_registry import registry
+from .inference_client import InferenceUnavailable, inference_client
 
-def predict_gender(image_path: str) -> str:
+MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
+GENDER_LIST = ['Male', 'Female']
+GENDER_INPUT_SIZE = (227, 227)
+
+def gender_blob(faces) -> np.ndarray:
+    return cv2.dnn.blobFromImages(faces, 1.0, GENDER_INPUT_SIZE, MODEL_MEAN_VALUES, swapRB=False)
+
+def gender_scores(faces) -> np.ndarray:
+    """Runs a list of BGR face images through the gender net in one forward pass."""
+    gender_net = registry.get('gender_net')
+    return gender_net.predict(gender_blob(faces))
+
+def predict_gender(image: np.ndarray) -> str:
     """
-    Loads the gender detection model and predicts the gender from a given image.
+    Predicts the gender from a given image using the host's inference server
+    when it is running, or the worker's resident gender net otherwise.
     
     Args:
-        image_path: The absolute path to the front-facing user image.
+        image: The front view's face crop (BGR), as cached by the ScanContext.
 
     Returns:
         A string, either 'Male' or 'Female'. Defaults to 'Male' on error.
     """
     try:
-        GENDER_MODEL_DIR = settings.AI_MODELS_DIR / 'gender_detection'
-        GENDER_PROTO = str(GENDER_MODEL_DIR / 'gender_deploy.prototxt')
-        GENDER_MODEL = str(GENDER_MODEL_DIR / 'gender_net.caffemodel')
-        
-        gender_net = cv2.dnn.readNet(GENDER_MODEL, GENDER_PROTO)
-        
-        image = cv2.imread(image_path)
         if image is None:
             raise IOError("Image could not be read.")
             
-        # The model expects a face image. We assume the input image is already
-        # cropped or centered on the face for this function.
-        face = image 
-        
-        MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
-        GENDER_LIST = ['Male', 'Female']
-        
-        blob = cv2.dnn.blobFromImage(face, 1.0, (227, 227), MODEL_MEAN_VALUES, swapRB=False)
-        
-        gender_net.setInput(blob)
-        gender_preds = gender_net.forward()
-        return GENDER_LIST[gender_preds[0].argmax()]
+        # The model expects a face image; the pipeline passes the padded face
+        # region found by the SSD detector, or the whole photo if none was found.
+        # Resizing here is the same resize blobFromImage would do, and keeps
+        # the request to the inference server small.
+        face = cv2.resize(image, GENDER_INPUT_SIZE)
+
+        try:
+            scores = inference_client.gender_scores(face)
+        except InferenceUnavailable:
+            scores = gender_scores([face])[0]
+        return GENDER_LIST[scores.argmax()]
         
     except Exception as e:
         print(f"Warning: Gender prediction failed with error: {e}. Defaulting to 'Male'.")
-        return 'Male'
\ No newline at end of file
+        return 'Male'
@@ -0,0 +1,59 @@
+# scans/processing/inference_backends.py
+
+from django.conf import settings
+import numpy as np
+
+
+class OpenCVGenderBackend:
+    """The original Caffe gender net, run through cv2.dnn."""
+    name = 'opencv'
+
+    def __init__(self):
+        import cv2
+
+        gender_model_dir = settings.AI_MODELS_DIR / 'gender_detection'
+        self.net = cv2.dnn.readNet(
+            str(gender_model_dir / 'gender_net.caffemodel'),
+            str(gender_model_dir / 'gender_deploy.prototxt'),
+        )
+
+    def predict(self, blob: np.ndarray) -> np.ndarray:
+        self.net.setInput(blob)
+        return self.net.forward()
+
+
+class OnnxGenderBackend:
+    """
+    An ONNX export of the gender net (optionally INT8-quantized with
+    manage.py quantize_gender_model), run through ONNX Runtime on the CPU.
+    """
+    name = 'onnx'
+
+    def __init__(self, model_path: str = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = settings.SCAN_ORT_INTRA_OP_THREADS
+        options.inter_op_num_threads = settings.SCAN_ORT_INTER_OP_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path or settings.SCAN_GENDER_ONNX_MODEL), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob.astype(np.float32, copy=False)})[0]
+
+
+GENDER_BACKENDS = {
+    OpenCVGenderBackend.name: OpenCVGenderBackend,
+    OnnxGenderBackend.name: OnnxGenderBackend,
+}
+
+
+def load_gender_backend(name: str = None):
+    name = name or settings.SCAN_GENDER_BACKEND
+    try:
+        backend_class = GENDER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown gender backend {name!r}; expected one of {', '.join(GENDER_BACKENDS)}.")
+    return backend_class()
@@ -0,0 +1,124 @@
+# scans/processing/inference_client.py
+
+import json
+import socket
+import struct
+import threading
+from django.conf import settings
+import numpy as np
+
+# Models the shared inference server (scans/processing/inference_server.py)
+# serves. Workers that can reach it do not need their own copies.
+REMOTE_MODELS = ('gender_net', 'face_mesh')
+
+_HEADER_LENGTH = struct.Struct('>I')
+
+
+class InferenceUnavailable(Exception):
+    """The inference server is not configured, not running or did not answer."""
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Inference socket closed.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, header: dict, payload: bytes = b''):
+    """A message is a length-prefixed JSON header followed by `payload_size` raw bytes."""
+    header = dict(header, payload_size=len(payload))
+    encoded = json.dumps(header).encode()
+    sock.sendall(_HEADER_LENGTH.pack(len(encoded)) + encoded + payload)
+
+
+def recv_message(sock) -> tuple:
+    (length,) = _HEADER_LENGTH.unpack(_recv_exact(sock, _HEADER_LENGTH.size))
+    header = json.loads(_recv_exact(sock, length))
+    payload = _recv_exact(sock, header['payload_size']) if header['payload_size'] else b''
+    return header, payload
+
+
+def encode_array(array: np.ndarray) -> tuple:
+    array = np.ascontiguousarray(array)
+    return {'shape': list(array.shape), 'dtype': str(array.dtype)}, array.tobytes()
+
+
+def decode_array(header: dict, payload: bytes) -> np.ndarray:
+    return np.frombuffer(payload, dtype=header['dtype']).reshape(header['shape'])
+
+
+class InferenceClient:
+    """
+    Talks to the host's inference server over SCAN_INFERENCE_SOCKET.
+
+    Each thread keeps its own connection. The server batches the requests
+    that the host's worker processes have in flight. Every call raises
+    InferenceUnavailable when the server cannot be used; callers fall back to
+    in-process inference.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            return connection
+        socket_path = settings.SCAN_INFERENCE_SOCKET
+        if not socket_path:
+            raise InferenceUnavailable("No inference socket is configured.")
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(settings.SCAN_INFERENCE_TIMEOUT)
+        try:
+            connection.connect(socket_path)
+        except OSError as e:
+            connection.close()
+            raise InferenceUnavailable(f"Cannot connect to {socket_path}: {e}")
+        self._local.connection = connection
+        return connection
+
+    def _close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _call(self, op: str, image: np.ndarray) -> tuple:
+        header, payload = encode_array(image)
+        try:
+            connection = self._connection()
+            send_message(connection, dict(header, op=op), payload)
+            reply, reply_payload = recv_message(connection)
+        except (OSError, ConnectionError, ValueError) as e:
+            self._close()
+            raise InferenceUnavailable(f"Inference server call failed: {e}")
+        if not reply['ok']:
+            raise InferenceUnavailable(f"Inference server error: {reply['error']}")
+        return reply, reply_payload
+
+    def is_available(self) -> bool:
+        try:
+            self._connection()
+            return True
+        except InferenceUnavailable:
+            return False
+
+    def gender_scores(self, face: np.ndarray) -> np.ndarray:
+        """Class scores of the gender net for one BGR face already resized to its input size."""
+        reply, _ = self._call('gender', face)
+        return np.array(reply['scores'], dtype=np.float32)
+
+    def face_mesh_landmarks(self, image_rgb: np.ndarray):
+        """Normalised (N, 3) FaceMesh landmarks of an RGB image, or None when no face is found."""
+        reply, payload = self._call('landmarks', image_rgb)
+        if not reply.get('face'):
+            return None
+        return decode_array(reply['array'], payload)
+
+
+inference_client = InferenceClient()
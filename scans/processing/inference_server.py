@@ -0,0 +1,113 @@
+# scans/processing/inference_server.py
+
+import os
+import queue
+import socketserver
+import threading
+import time
+
+from .inference_client import decode_array, encode_array, recv_message, send_message
+from .gender_predictor import gender_scores
+from .measurement import face_mesh_landmarks
+
+
+class _Request:
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects requests from many connections and runs them through `run_batch`
+    together. A batch closes when `max_batch` requests are waiting or
+    `window_seconds` have passed since its first request. `threads` consumers
+    drain the same queue.
+    """
+
+    def __init__(self, run_batch, window_seconds: float, max_batch: int, threads: int = 1):
+        self.run_batch = run_batch
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        for _ in range(threads):
+            threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, item):
+        request = _Request(item)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = self.run_batch([request.item for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+
+class _InferenceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # One connection per worker thread; it stays open across scans.
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                image = decode_array(header, payload)
+                if header['op'] == 'gender':
+                    scores = self.server.gender.submit(image)
+                    send_message(self.request, {'ok': True, 'scores': scores.tolist()})
+                elif header['op'] == 'landmarks':
+                    points = self.server.landmarks.submit(image)
+                    if points is None:
+                        send_message(self.request, {'ok': True, 'face': False})
+                    else:
+                        array_header, array_payload = encode_array(points)
+                        send_message(self.request, {'ok': True, 'face': True, 'array': array_header}, array_payload)
+                else:
+                    send_message(self.request, {'ok': False, 'error': f"Unknown op {header['op']!r}"})
+            except Exception as e:
+                send_message(self.request, {'ok': False, 'error': str(e)})
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Serves the gender net and FaceMesh to every Celery worker on the host.
+
+    Gender requests arriving within the batch window are stacked into one
+    blobFromImages/forward call. FaceMesh has no batch API, so landmark
+    requests are spread over a fixed number of threads, each with its own graph.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, window_seconds: float, max_batch: int, face_mesh_threads: int):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _InferenceHandler)
+        self.gender = MicroBatcher(gender_scores, window_seconds, max_batch)
+        self.landmarks = MicroBatcher(
+            lambda images: [face_mesh_landmarks(image) for image in images],
+            window_seconds=0, max_batch=1, threads=face_mesh_threads)
@@ -0,0 +1,26 @@
+# scans/processing/landmark_store.py
+
+import io
+import numpy as np
+from .artifacts import write_artifact
+
+
+def save_landmarks(scan_id: str, landmarks: dict, gender: str) -> str:
+    """
+    Stores every detected view's (N, 3) landmark array as float32 in one .npz
+    under scans/landmarks/ in the default storage, together with the predicted
+    gender. Views without a detected face are left out. Returns the storage name.
+    """
+    arrays = {view: np.asarray(points, dtype=np.float32)
+              for view, points in landmarks.items() if points is not None}
+    buffer = io.BytesIO()
+    np.savez(buffer, gender=np.array(gender), **arrays)
+    return write_artifact(f"scans/landmarks/{scan_id}.npz", buffer.getvalue())
+
+
+def load_landmarks(file) -> tuple:
+    """Returns ({view: (N, 3) float32 array}, gender) from a stored landmarks file."""
+    with np.load(file) as data:
+        gender = str(data['gender'])
+        landmarks = {name: data[name] for name in data.files if name != 'gender'}
+    return landmarks, gender
@@ -1,7 +1,8 @@
-import cv2
-import mediapipe as mp
+from dataclasses import dataclass
 import numpy as np
 from typing import Dict, Optional, Tuple
+from .model_registry import registry
+from .inference_client import InferenceUnavailable, inference_client
 
 ASSUMED_IPD_MM = 64.0
 LEFT_PUPIL_INDEX = 473
@@ -13,38 +14,113 @@ RIGHT_EAR_TRAGUS_INDEX = 454
 TOP_OF_FOREHEAD_INDEX = 10
 BOTTOM_OF_CHIN_INDEX = 152
 
-def calculate_pixel_distance(p1, p2, image_width_px: int, image_height_px: int) -> float:
-    p1_px = np.array([p1.x * image_width_px, p1.y * image_height_px])
-    p2_px = np.array([p2.x * image_width_px, p2.y * image_height_px])
-    return np.linalg.norm(p1_px - p2_px)
-
-def get_dynamic_2d_measurements(image_path: str) -> Optional[Dict[str, float]]:
-    mp_face_mesh = mp.solutions.face_mesh
-    with mp_face_mesh.FaceMesh(
-            static_image_mode=True, max_num_faces=1, refine_landmarks=True,
-            min_detection_confidence=0.5) as face_mesh:
-
-        image = cv2.imread(image_path)
-        if image is None: return None
-            
-        image_height_px, image_width_px, _ = image.shape
-        results = face_mesh.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-
-        if not results.multi_face_landmarks: return None
-        landmarks = results.multi_face_landmarks[0].landmark
-
-        ipd_pixels = calculate_pixel_distance(landmarks[LEFT_PUPIL_INDEX], landmarks[RIGHT_PUPIL_INDEX], image_width_px, image_height_px)
-        if ipd_pixels < 1: return None
-        
-        pixels_per_mm = ipd_pixels / ASSUMED_IPD_MM
-
-        dynamic_measurements = {
-            "eye_to_eye": ASSUMED_IPD_MM,
-            "ear_to_ear": calculate_pixel_distance(landmarks[LEFT_EAR_TRAGUS_INDEX], landmarks[RIGHT_EAR_TRAGUS_INDEX], image_width_px, image_height_px) / pixels_per_mm,
-            "head_width": calculate_pixel_distance(landmarks[LEFT_CHEEK_INDEX], landmarks[RIGHT_CHEEK_INDEX], image_width_px, image_height_px) / pixels_per_mm,
-            "head_height": calculate_pixel_distance(landmarks[TOP_OF_FOREHEAD_INDEX], landmarks[BOTTOM_OF_CHIN_INDEX], image_width_px, image_height_px) / pixels_per_mm,
-        }
-        return dynamic_measurements
+@dataclass(frozen=True)
+class LandmarkMeasurement:
+    """
+    A distance read off the FaceMesh landmarks.
+
+    `path` lists landmark indices; every consecutive pair is one segment and
+    the measurement is the summed segment length, so a two-index path is a
+    straight distance and a longer one follows a contour. `space='3d'` also
+    uses MediaPipe's relative depth, '2d' only the image plane.
+    """
+    name: str
+    path: Tuple[int, ...]
+    space: str = '2d'
+
+# The pupil distance is the scale reference: it is mapped to ASSUMED_IPD_MM.
+IPD_MEASUREMENT = 'ipd'
+
+LANDMARK_MEASUREMENTS = (
+    LandmarkMeasurement(IPD_MEASUREMENT, (LEFT_PUPIL_INDEX, RIGHT_PUPIL_INDEX)),
+    LandmarkMeasurement('ear_to_ear', (LEFT_EAR_TRAGUS_INDEX, RIGHT_EAR_TRAGUS_INDEX)),
+    LandmarkMeasurement('head_width', (LEFT_CHEEK_INDEX, RIGHT_CHEEK_INDEX)),
+    LandmarkMeasurement('head_height', (TOP_OF_FOREHEAD_INDEX, BOTTOM_OF_CHIN_INDEX)),
+)
+
+class MeasurementTable:
+    """
+    Compiles a set of LandmarkMeasurements into flat segment arrays so that
+    all of them are evaluated in one vectorised pass, for a single (N, 3)
+    landmark array or a (B, N, 3) batch of them.
+    """
+
+    def __init__(self, measurements):
+        self.names = tuple(m.name for m in measurements)
+        starts, ends, owners, axis_masks = [], [], [], []
+        for owner, measurement in enumerate(measurements):
+            mask = (1.0, 1.0, 1.0) if measurement.space == '3d' else (1.0, 1.0, 0.0)
+            for start, end in zip(measurement.path[:-1], measurement.path[1:]):
+                starts.append(start)
+                ends.append(end)
+                owners.append(owner)
+                axis_masks.append(mask)
+        self.starts = np.array(starts, dtype=np.intp)
+        self.ends = np.array(ends, dtype=np.intp)
+        self.axis_masks = np.array(axis_masks, dtype=np.float32)
+        # (segments, measurements) 0/1 matrix that sums segments per measurement.
+        self.owner_matrix = np.zeros((len(starts), len(self.names)), dtype=np.float32)
+        self.owner_matrix[np.arange(len(starts)), owners] = 1.0
+
+    def pixel_lengths(self, points: np.ndarray) -> np.ndarray:
+        """(..., N, 3) landmarks -> (..., M) lengths in pixels, in `names` order."""
+        segments = (points[..., self.ends, :] - points[..., self.starts, :]) * self.axis_masks
+        return np.linalg.norm(segments, axis=-1) @ self.owner_matrix
+
+    def millimetres(self, points: np.ndarray) -> np.ndarray:
+        """
+        Lengths scaled so the pupil distance equals ASSUMED_IPD_MM. Rows whose
+        pupil distance is under one pixel (no usable face) come back as NaN.
+        """
+        lengths = self.pixel_lengths(points)
+        ipd_pixels = lengths[..., self.names.index(IPD_MEASUREMENT)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(ipd_pixels >= 1, ASSUMED_IPD_MM / ipd_pixels, np.nan)
+        return lengths * scale[..., None]
+
+    def as_dict(self, row: np.ndarray) -> Optional[Dict[str, float]]:
+        if np.isnan(row).any():
+            return None
+        values = {name: float(value) for name, value in zip(self.names, row)}
+        values['eye_to_eye'] = values.pop(IPD_MEASUREMENT)
+        return values
+
+MEASUREMENT_TABLE = MeasurementTable(LANDMARK_MEASUREMENTS)
+
+def face_mesh_landmarks(image_rgb: np.ndarray) -> Optional[np.ndarray]:
+    """FaceMesh landmarks of an RGB image as a normalised (N, 3) array, or None."""
+    # The FaceMesh graph is built once per worker by the model registry.
+    face_mesh = registry.get('face_mesh')
+
+    results = face_mesh.process(image_rgb)
+    if not results.multi_face_landmarks: return None
+
+    return np.array(
+        [(lm.x, lm.y, lm.z) for lm in results.multi_face_landmarks[0].landmark],
+        dtype=np.float32)
+
+def detect_landmarks(prepared) -> Optional[np.ndarray]:
+    """
+    Runs FaceMesh on a resolution-bounded view and returns the landmarks as an
+    (N, 3) array in the ORIGINAL photo's pixel space, so measurements do not
+    depend on how far the view was downsized.
+
+    Uses the host's shared inference server when one is running and falls
+    back to the worker's own FaceMesh otherwise.
+    """
+    try:
+        normalized = inference_client.face_mesh_landmarks(prepared.image)
+    except InferenceUnavailable:
+        normalized = face_mesh_landmarks(prepared.image)
+    if normalized is None: return None
+
+    image_height_px, image_width_px = prepared.image.shape[:2]
+    points = normalized * np.array([image_width_px, image_height_px, image_width_px], dtype=np.float32)
+    return prepared.to_original_pixels(points)
+
+def get_dynamic_2d_measurements(landmarks: Optional[np.ndarray]) -> Optional[Dict[str, float]]:
+    if landmarks is None: return None
+    return MEASUREMENT_TABLE.as_dict(MEASUREMENT_TABLE.millimetres(landmarks))
 
 AVERAGE_MALE_MEASUREMENTS_MM = {
     'head_circumference_A': 570.0, 'forehead_to_back_B': 360.0, 'cross_measurement_C': 340.0,
@@ -59,21 +135,37 @@ AVERAGE_FEMALE_MEASUREMENTS_MM = {
     'cheek_guard_height_M': 82.0, 'cheek_guard_width_N': 92.0,
 }
 
-def get_surface_measurements_from_model(model_path: str, gender: str, front_image_path: str) -> Dict[str, float]:
-    print("--- Using SMART BYPASS Measurement Logic ---")
-
-    dynamic_app_measurements = get_dynamic_2d_measurements(front_image_path)
-    if dynamic_app_measurements is None:
-        raise ValueError("Failed to detect a face or landmarks in the front-facing photo.")
+# Measurements with no geometric definition on the mesh yet; they are scaled
+# from the averages by the ratio of the measured to the average circumference.
+SCALED_MEASUREMENTS = (
+    'ear_height_G', 'ear_width_H', 'cheek_guard_clearance_L',
+    'cheek_guard_height_M', 'cheek_guard_width_N',
+)
 
+def combine_measurements(gender: str, dynamic_app_measurements: Dict[str, float],
+                         surface_measurements: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Merges the landmark measurements with the ones taken off the reconstructed
+    mesh (all in mm). Anything the mesh did not yield comes from the averages
+    for `gender`; ear and cheek-guard sizes are scaled by the head's
+    circumference relative to the average one.
+    """
     if gender == "Female":
         static_backend_measurements = AVERAGE_FEMALE_MEASUREMENTS_MM.copy()
     else: 
         static_backend_measurements = AVERAGE_MALE_MEASUREMENTS_MM.copy()
 
     final_measurements = static_backend_measurements
+    surface_measurements = surface_measurements or {}
+    circumference = surface_measurements.get('head_circumference_A')
+    if circumference:
+        size_ratio = circumference / final_measurements['head_circumference_A']
+        for name in SCALED_MEASUREMENTS:
+            final_measurements[name] *= size_ratio
+    final_measurements.update(surface_measurements)
     final_measurements.update(dynamic_app_measurements)
     
-    final_measurements['head_length'] = final_measurements['head_height'] * 1.1
+    if 'head_length' not in final_measurements:
+        final_measurements['head_length'] = final_measurements['head_height'] * 1.1
 
-    return {k: round(v, 2) for k, v in final_measurements.items()}
\ No newline at end of file
+    return {k: round(v, 2) for k, v in final_measurements.items()}
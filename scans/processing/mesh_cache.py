@@ -0,0 +1,76 @@
+# scans/processing/mesh_cache.py
+
+import json
+import os
+from pathlib import Path
+from django.conf import settings
+import numpy as np
+import trimesh
+
+
+class BaseMesh:
+    """
+    A base head converted from OBJ into raw .npy arrays.
+
+    The arrays are memory-mapped, so every worker on the host shares the same
+    pages through the page cache. instantiate() maps them copy-on-write: a scan
+    can deform its mesh freely while untouched pages stay shared.
+    """
+
+    def __init__(self, vertices_path: Path, faces_path: Path):
+        self.vertices_path = vertices_path
+        self.faces_path = faces_path
+        # Read-only maps that keep the mesh resident for the worker's lifetime.
+        self.vertices = np.load(vertices_path, mmap_mode='r')
+        self.faces = np.load(faces_path, mmap_mode='r')
+
+    def instantiate(self) -> trimesh.Trimesh:
+        # float64/int64 on disk match trimesh's internal dtypes, so the arrays
+        # are wrapped as they are instead of being converted into a copy.
+        return trimesh.Trimesh(
+            vertices=np.load(self.vertices_path, mmap_mode='c'),
+            faces=np.load(self.faces_path, mmap_mode='c'),
+            process=False,
+        )
+
+
+def _source_signature(source: Path) -> dict:
+    stat = source.stat()
+    return {'source': source.name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _save_atomic(path: Path, array: np.ndarray):
+    # Several worker processes may build the cache at the same time on start-up.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def load_base_mesh(source: Path) -> BaseMesh:
+    """
+    Returns the cached binary form of `source`, converting the OBJ first if
+    the cache is missing or older than the OBJ.
+    """
+    cache_dir = Path(settings.SCAN_MESH_CACHE_DIR)
+    vertices_path = cache_dir / f"{source.stem}.vertices.npy"
+    faces_path = cache_dir / f"{source.stem}.faces.npy"
+    meta_path = cache_dir / f"{source.stem}.json"
+
+    signature = _source_signature(source)
+    try:
+        is_fresh = json.loads(meta_path.read_text()) == signature
+    except (OSError, ValueError):
+        is_fresh = False
+
+    if not (is_fresh and vertices_path.exists() and faces_path.exists()):
+        print(f"Building binary mesh cache for {source.name}")
+        os.makedirs(cache_dir, exist_ok=True)
+        mesh = trimesh.load(source, force='mesh')
+        _save_atomic(vertices_path, np.ascontiguousarray(mesh.vertices, dtype=np.float64))
+        _save_atomic(faces_path, np.ascontiguousarray(mesh.faces, dtype=np.int64))
+        tmp_meta_path = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+        tmp_meta_path.write_text(json.dumps(signature))
+        os.replace(tmp_meta_path, meta_path)
+
+    return BaseMesh(vertices_path, faces_path)
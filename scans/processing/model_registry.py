@@ -0,0 +1,152 @@
+# scans/processing/model_registry.py
+
+import threading
+import time
+from django.conf import settings
+
+
+class ModelRegistry:
+    """
+    Keeps the pipeline's models resident for the lifetime of a worker process.
+
+    Each model is built by its loader the first time it is requested (or by
+    warm_up() when the worker process starts) and the same instance is handed
+    out to every scan afterwards. Load time and hit counts are kept per model
+    so the task can report them.
+
+    Models registered with per_thread=True get one instance per thread. Only
+    FaceMesh needs this: its graph must not be driven from two threads at
+    once, and the inference server runs it on SCAN_INFERENCE_FACE_MESH_THREADS
+    threads. A Celery worker process runs one view at a time, so everything
+    else is shared.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._per_thread = set()
+        self._thread_models = threading.local()
+        self._thread_instances = []
+        self._stats = {}
+        # Re-entrant: a loader may get() the models it is built from.
+        self._lock = threading.RLock()
+
+    def register(self, name: str, loader, closer=None, per_thread: bool = False):
+        self._loaders[name] = (loader, closer)
+        self._stats[name] = {'loaded': False, 'load_seconds': None, 'hits': 0}
+        if per_thread:
+            self._per_thread.add(name)
+
+    @property
+    def names(self):
+        return tuple(self._loaders)
+
+    def _models_for(self, name: str) -> dict:
+        if name not in self._per_thread:
+            return self._models
+        models = getattr(self._thread_models, 'models', None)
+        if models is None:
+            models = self._thread_models.models = {}
+        return models
+
+    def get(self, name: str):
+        models = self._models_for(name)
+        model = models.get(name)
+        if model is None:
+            with self._lock:
+                model = models.get(name)
+                if model is None:
+                    return self._load(name)
+        self._stats[name]['hits'] += 1
+        return model
+
+    def _load(self, name: str):
+        loader, _ = self._loaders[name]
+        started = time.perf_counter()
+        model = loader()
+        elapsed = time.perf_counter() - started
+        self._models_for(name)[name] = model
+        if name in self._per_thread:
+            self._thread_instances.append((name, model))
+        self._stats[name].update(loaded=True, load_seconds=round(elapsed, 3))
+        print(f"Model registry: loaded '{name}' in {elapsed:.2f}s")
+        return model
+
+    def warm_up(self, names=None):
+        """Loads every registered model (or just `names`) ahead of the first scan."""
+        for name in names or list(self._loaders):
+            try:
+                models = self._models_for(name)
+                if name not in models:
+                    with self._lock:
+                        if name not in models:
+                            self._load(name)
+            except Exception as e:
+                # A missing model file must not kill the worker; the stage that
+                # needs it will fail (or fall back) when the scan runs.
+                print(f"Warning: Could not warm up model '{name}': {e}")
+
+    def close(self):
+        with self._lock:
+            for name, model in list(self._models.items()) + self._thread_instances:
+                _, closer = self._loaders[name]
+                if closer is not None:
+                    closer(model)
+            self._models.clear()
+            self._thread_instances.clear()
+            self._thread_models = threading.local()
+            for stats in self._stats.values():
+                stats['loaded'] = False
+
+    def report(self) -> dict:
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+def _load_gender_net():
+    # cv2.dnn or ONNX Runtime, depending on SCAN_GENDER_BACKEND.
+    from .inference_backends import load_gender_backend
+    return load_gender_backend()
+
+
+def _load_face_detector():
+    import cv2
+
+    face_model_dir = settings.AI_MODELS_DIR / 'face_detection'
+    return cv2.dnn.readNetFromCaffe(
+        str(face_model_dir / 'deploy.prototxt'),
+        str(face_model_dir / 'res10_300x300_ssd_iter_140000.caffemodel'),
+    )
+
+
+def _load_face_mesh():
+    import mediapipe as mp
+
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=True, max_num_faces=1, refine_landmarks=True,
+        min_detection_confidence=0.5)
+
+
+def _base_head_loader(filename: str):
+    def load():
+        from .mesh_cache import load_base_mesh
+        return load_base_mesh(settings.AI_MODELS_DIR / 'base_heads' / filename)
+    return load
+
+
+def _head_deformer_loader(base_head_name: str, filename: str):
+    def load():
+        from .deformation import LandmarkDeformer, load_anchors
+        base_mesh = registry.get(base_head_name)
+        anchors = load_anchors(settings.AI_MODELS_DIR / 'base_heads' / filename, base_mesh.vertices)
+        return LandmarkDeformer(base_mesh.vertices, base_mesh.faces, anchors)
+    return load
+
+
+registry = ModelRegistry()
+registry.register('gender_net', _load_gender_net)
+registry.register('face_detector', _load_face_detector)
+registry.register('face_mesh', _load_face_mesh, closer=lambda face_mesh: face_mesh.close(), per_thread=True)
+registry.register('base_head_male', _base_head_loader('male_head.obj'))
+registry.register('base_head_female', _base_head_loader('female_head.obj'))
+registry.register('head_deformer_male', _head_deformer_loader('base_head_male', 'male_head.obj'))
+registry.register('head_deformer_female', _head_deformer_loader('base_head_female', 'female_head.obj'))
@@ -1,24 +1,168 @@
-from .reconstruction import generate_head_model
-from .measurement import get_surface_measurements_from_model
-
-def run_full_scan_pipeline(scan) -> dict:
-    reconstruction_results = generate_head_model(
-        image_paths={...},
-        scan_id=str(scan.id)
-    )
-    
-    model_file_path = reconstruction_results['output_model_absolute_path']
-    gender = reconstruction_results['gender']
-
-    measurement_results = get_surface_measurements_from_model(
-        model_path=model_file_path,
-        gender=gender,
-        front_image_path=scan.image_front.path 
-    )
-    
-    final_results = {
-        "measurements": measurement_results,
-        "reconstruction": reconstruction_results
+from django.conf import settings
+import numpy as np
+import trimesh
+from ..quality import ImageQualityError
+from .context import ScanContext
+from .checkpoints import load_checkpoint, save_checkpoint
+from .face_detection import find_face_roi
+from .preprocess import prepare_view
+from .quality_gate import raise_for_quality_issues, view_quality_issues
+from .gender_predictor import predict_gender
+from .reconstruction import generate_head_model, export_head_model
+from .measurement import detect_landmarks
+from .surface_measurement import get_surface_measurements_from_model
+from .landmark_store import save_landmarks
+from .stages import Stage, StageError, run_stages
+
+
+def predict_view_gender(context, view, face_roi):
+    if face_roi is None:
+        return predict_gender(context.bgr(view))
+    return predict_gender(context.downscaled(view, settings.SCAN_MAX_IMAGE_EDGE, box=face_roi.box))
+
+
+def reconstruct_head(scan_id, gender, landmarks):
+    # The deformed mesh is checkpointed, so a retried scan resumes from here.
+    checkpoint = load_checkpoint(scan_id, 'reconstruction')
+    if checkpoint is not None:
+        _, arrays = checkpoint
+        return trimesh.Trimesh(vertices=arrays['vertices'], faces=arrays['faces'], process=False)
+    head_mesh = generate_head_model(gender, landmarks)
+    save_checkpoint(scan_id, 'reconstruction', {'gender': gender},
+                    {'vertices': np.asarray(head_mesh.vertices), 'faces': np.asarray(head_mesh.faces)})
+    return head_mesh
+
+
+def export_outputs(scan_id, head_mesh, landmarks, gender):
+    return {
+        'reconstruction': export_head_model(head_mesh, scan_id),
+        # Keeping the raw landmarks lets measurements be recomputed without inference.
+        'landmarks_file': save_landmarks(scan_id, landmarks, gender),
+    }
+
+
+# Per-view work. Each view only needs its own photo, so a scan's views can run
+# as separate tasks on different workers (see scans.tasks).
+CHECK_STAGES = (
+    # Every later stage reads the decoded photo from the context, so the view
+    # is read from disk and decoded at most once.
+    Stage('decode', lambda context, view: context.bgr(view), inputs=('context', 'view')),
+    Stage('quality', view_quality_issues, inputs=('context', 'view'), outputs=('quality_issues',)),
+)
+VIEW_STAGES = (
+    Stage('face_detection', find_face_roi, inputs=('context', 'view'), outputs=('face_roi',)),
+    # Views without a detected face (e.g. the back) are prepared whole.
+    Stage('preprocess', lambda context, view, face_roi: prepare_view(context, view, roi=face_roi),
+          inputs=('context', 'view', 'face_roi'), outputs=('prepared_view',)),
+    # Landmarks come back in the original photo's pixel space.
+    Stage('landmarks', lambda prepared_view: detect_landmarks(prepared_view),
+          inputs=('prepared_view',), outputs=('landmarks',)),
+)
+FRONT_STAGES = (
+    Stage('gender', predict_view_gender, inputs=('context', 'view', 'face_roi'), outputs=('gender',)),
+)
+
+# Whole-scan work, once every view is done.
+FINISH_STAGES = (
+    Stage('reconstruction', reconstruct_head, inputs=('scan_id', 'gender', 'landmarks'), outputs=('head_mesh',)),
+    Stage('measurement',
+          lambda head_mesh, gender, landmarks: get_surface_measurements_from_model(
+              mesh=head_mesh, gender=gender, front_landmarks=landmarks.get('front')),
+          inputs=('head_mesh', 'gender', 'landmarks'), outputs=('measurements',)),
+    Stage('export', export_outputs, inputs=('scan_id', 'head_mesh', 'landmarks', 'gender'),
+          outputs=('reconstruction', 'landmarks_file')),
+)
+
+
+def _log_stage(record):
+    view = f" ({record['view']})" if 'view' in record else ''
+    print(f"Stage '{record['stage']}'{view}: {record['wall_ms']} ms wall, {record['cpu_ms']} ms CPU, "
+          f"RSS {record['rss_mb']} MB (grew {record['rss_growth_mb']} MB)")
+
+
+def _run(stages, state, timings: list, view: str = None, on_stage=None) -> list:
+    def finished(record):
+        if view is not None:
+            record['view'] = view
+        _log_stage(record)
+        if on_stage is not None:
+            on_stage(record)
+    try:
+        return timings + run_stages(stages, state, on_stage=finished)
+    except StageError as e:
+        e.stage_timings = timings + e.stage_timings
+        raise
+
+
+def analyze_view(context, view: str, on_stage=None) -> tuple:
+    """
+    Everything the pipeline does with a single photo. Stops after the quality
+    check if the view has problems. `on_stage(record)` is called with each
+    stage's timing record as it finishes.
+
+    Returns (summary, landmarks): a JSON-safe summary with the view's quality
+    issues, face box, gender (front view only) and stage timings, and the
+    view's (N, 3) landmarks or None.
+    """
+    state = {'context': context, 'view': view}
+    timings = _run(CHECK_STAGES, state, [], view, on_stage)
+    if not state['quality_issues']:
+        stages = VIEW_STAGES + (FRONT_STAGES if view == 'front' else ())
+        timings = _run(stages, state, timings, view, on_stage)
+
+    face_roi = state.get('face_roi')
+    summary = {
+        'view': view,
+        'quality_issues': state['quality_issues'],
+        'face_roi': list(face_roi.box) if face_roi is not None else None,
+        'gender': state.get('gender'),
+        'stage_timings': timings,
+    }
+    return summary, state.get('landmarks')
+
+
+def analyze_view_checkpointed(scan, view: str, on_stage=None) -> dict:
+    """analyze_view() for a stored scan, skipped if an earlier run already finished it."""
+    scan_id = str(scan.id)
+    checkpoint = load_checkpoint(scan_id, f'view-{view}')
+    if checkpoint is not None:
+        print(f"Scan {scan_id}: reusing the checkpointed {view} view.")
+        return checkpoint[0]
+
+    summary, landmarks = analyze_view(ScanContext.from_scan(scan), view, on_stage)
+    arrays = {'landmarks': landmarks} if landmarks is not None else {}
+    save_checkpoint(scan_id, f'view-{view}', summary, arrays)
+    return summary
+
+
+def finish_scan(scan_id: str, summaries: dict, on_stage=None) -> dict:
+    """
+    Reconstructs, measures and exports a scan from its views' summaries and
+    checkpointed landmarks, after failing it if any view had quality issues.
+    """
+    timings = [record for summary in summaries.values() for record in summary['stage_timings']]
+    try:
+        raise_for_quality_issues([issue for summary in summaries.values() for issue in summary['quality_issues']])
+    except ImageQualityError as e:
+        raise StageError('quality', e, timings) from e
+
+    landmarks = {}
+    for view in summaries:
+        checkpoint = load_checkpoint(scan_id, f'view-{view}')
+        if checkpoint is None:
+            # Cleared by the stale sweeper or a reprocess_scans run after the view finished.
+            raise RuntimeError(f"The checkpoint of the {view} view is missing; the scan has to be processed again.")
+        landmarks[view] = checkpoint[1].get('landmarks')
+
+    state = {
+        'scan_id': scan_id,
+        'gender': summaries.get('front', {}).get('gender') or 'Male',
+        'landmarks': landmarks,
+    }
+    timings = _run(FINISH_STAGES, state, timings, on_stage=on_stage)
+    return {
+        "measurements": state['measurements'],
+        "reconstruction": state['reconstruction'],
+        "landmarks_file": state['landmarks_file'],
+        "stage_timings": timings,
     }
-    
-    return final_results
\ No newline at end of file
@@ -0,0 +1,51 @@
+# scans/processing/preprocess.py
+
+from dataclasses import dataclass
+from django.conf import settings
+import numpy as np
+
+
+@dataclass(frozen=True)
+class PreparedView:
+    """
+    A view (or the face region cut from it) downsized for landmark detection.
+
+    `scale_x`/`scale_y` are prepared pixels per original pixel (<= 1.0), so
+    coordinates found on `image` map back to the uploaded photo by dividing by
+    them and adding the crop's `offset_x`/`offset_y`. Depth (z) follows
+    MediaPipe's convention and is scaled like x.
+    """
+    view: str
+    image: np.ndarray
+    scale_x: float
+    scale_y: float
+    original_shape: tuple
+    offset_x: int = 0
+    offset_y: int = 0
+
+    def to_original_pixels(self, points: np.ndarray) -> np.ndarray:
+        scale = np.array([self.scale_x, self.scale_y, self.scale_x], dtype=points.dtype)
+        offset = np.array([self.offset_x, self.offset_y, 0], dtype=points.dtype)
+        return points / scale + offset
+
+
+def prepare_view(context, view: str, max_edge: int = None, roi=None) -> PreparedView:
+    """
+    Bounds a view, or just its face `roi` when one was found, to `max_edge`
+    pixels on its longest side (SCAN_MAX_IMAGE_EDGE by default). The RGB
+    derivative is cached on the context for later stages.
+    """
+    max_edge = max_edge or settings.SCAN_MAX_IMAGE_EDGE
+    original_shape = context.shape(view)
+    box = roi.box if roi is not None else None
+    image = context.downscaled(view, max_edge, color='rgb', box=box)
+    x0, y0, x1, y1 = box or (0, 0, original_shape[1], original_shape[0])
+    return PreparedView(
+        view=view,
+        image=image,
+        scale_x=image.shape[1] / (x1 - x0),
+        scale_y=image.shape[0] / (y1 - y0),
+        original_shape=original_shape,
+        offset_x=x0,
+        offset_y=y0,
+    )
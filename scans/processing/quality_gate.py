@@ -0,0 +1,34 @@
+# scans/processing/quality_gate.py
+
+from django.conf import settings
+import cv2
+from ..quality import ImageQualityError, image_quality_issues
+from .face_detection import detect_view_face
+
+
+def view_quality_issues(context, view: str) -> list:
+    """
+    Resolution, exposure and blur on a thumbnail of one view, plus the SSD's
+    face-presence check on the front view. Returns the problems found.
+    """
+    thumbnail = context.downscaled(view, settings.SCAN_QUALITY_THUMBNAIL_EDGE)
+    height, width = context.shape(view)
+    issues = image_quality_issues(cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY), (width, height), f"{view} photo")
+
+    if view == 'front':
+        try:
+            face = detect_view_face(context, view)
+        except Exception as e:
+            # Without the detector weights the face check is skipped, not failed.
+            print(f"Warning: Skipping the face-presence check: {e}")
+        else:
+            if face is None:
+                issues.append("No face was found in the front photo; face the camera with "
+                              "your whole head in frame.")
+    return issues
+
+
+def raise_for_quality_issues(issues: list):
+    """Fails the scan with every problem found across its views."""
+    if issues:
+        raise ImageQualityError(' '.join(issues))
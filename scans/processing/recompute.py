@@ -0,0 +1,43 @@
+# scans/processing/recompute.py
+
+import numpy as np
+from .landmark_store import load_landmarks
+from .measurement import MEASUREMENT_TABLE, combine_measurements
+
+
+def recompute_measurements(scans) -> list:
+    """
+    Re-derives the landmark measurements of `scans` from their stored
+    landmarks only, without touching the photos, the mesh or any model. All
+    front-view landmark sets are measured in a single vectorised batch.
+
+    Returns [(scan, measurements_mm or None)] in the order given; None marks a
+    scan whose stored landmarks no longer yield a usable face.
+    """
+    loaded = []
+    for scan in scans:
+        with scan.landmarks_file.open('rb') as f:
+            landmarks, gender = load_landmarks(f)
+        loaded.append((scan, landmarks.get('front'), gender))
+
+    with_front = [entry for entry in loaded if entry[1] is not None]
+    rows = {}
+    if with_front:
+        batch = MEASUREMENT_TABLE.millimetres(np.stack([front for _, front, _ in with_front]))
+        rows = {id(scan): row for (scan, _, _), row in zip(with_front, batch)}
+
+    results = []
+    for scan, _, gender in loaded:
+        row = rows.get(id(scan))
+        dynamic = MEASUREMENT_TABLE.as_dict(row) if row is not None else None
+        if not dynamic:
+            results.append((scan, None))
+            continue
+        # Surface measurements come from the mesh, which recomputing does not
+        # touch, so the stored values (cm) are carried over.
+        surface = {
+            field: float(getattr(scan, field)) * 10.0 for field in scan.MEASUREMENT_FIELDS
+            if field not in dynamic and getattr(scan, field) is not None
+        }
+        results.append((scan, combine_measurements(gender, dynamic, surface)))
+    return results
@@ -1,33 +1,111 @@
+from typing import Optional
+import numpy as np
 from django.conf import settings
-import os
-import shutil
-from pathlib import Path
-import trimesh
-
-def reshape_model_to_match_photos(base_mesh, image_paths):
-    print("--- Running Placeholder 3D Reshaping Logic ---")
-    reshaped_mesh = base_mesh
-    return reshaped_mesh
-
-def generate_head_model(image_paths: dict, scan_id: str) -> dict:
-    gender = "Male" 
-    base_heads_dir = Path(settings.AI_MODELS_DIR) / 'base_heads'
-    base_model_path = base_heads_dir / ('female_head.obj' if gender == 'Female' else 'male_head.obj')
-
-    base_mesh = trimesh.load(base_model_path)
-    
-    newly_shaped_mesh = reshape_model_to_match_photos(base_mesh, image_paths)
-    
-    media_root_path = Path(settings.MEDIA_ROOT)
-    output_dir = media_root_path / 'scans/outputs'
-    os.makedirs(output_dir, exist_ok=True)
-    output_model_filename = f"{scan_id}.obj"
-    output_model_absolute_path = output_dir / output_model_filename
-    
-    newly_shaped_mesh.export(str(output_model_absolute_path))
+from .artifacts import write_artifact
+from .model_registry import registry
+from .measurement import (
+    ASSUMED_IPD_MM, LEFT_PUPIL_INDEX, RIGHT_PUPIL_INDEX, LEFT_EAR_TRAGUS_INDEX,
+    RIGHT_EAR_TRAGUS_INDEX, TOP_OF_FOREHEAD_INDEX, BOTTOM_OF_CHIN_INDEX,
+)
+from .export import export_model_variants
+
+NOSE_TIP_INDEX = 1
+# Image coordinates (x right, y down, MediaPipe z towards the camera negative)
+# to the base head's frame (x right, y up, +z out of the face).
+IMAGE_TO_HEAD = np.array([1.0, -1.0, -1.0])
+# Limits on the correction the profile views may apply to FaceMesh's relative depth.
+MIN_DEPTH_FACTOR, MAX_DEPTH_FACTOR = 0.5, 2.0
+# An anchor that would move further than this fraction of the base head's
+# size means the landmarks are not a plausible face; the base shape is kept.
+MAX_ANCHOR_SHIFT = 0.25
+
+def _profile_depth_factor(landmarks: dict) -> float:
+    """
+    How much deeper the face is than FaceMesh's front-view z says: the
+    nose-to-tragus distance seen in the left/right photos, brought to the
+    front photo's scale by the forehead-to-chin height, over the same
+    distance along z in the front view. 1.0 when no profile face was found.
+    """
+    front = landmarks['front']
+    front_height = abs(front[BOTTOM_OF_CHIN_INDEX, 1] - front[TOP_OF_FOREHEAD_INDEX, 1])
+    tragi = (LEFT_EAR_TRAGUS_INDEX, RIGHT_EAR_TRAGUS_INDEX)
+    front_depth = front[tragi, 2].mean() - front[NOSE_TIP_INDEX, 2]
+    factors = []
+    for view in ('left', 'right'):
+        side = landmarks.get(view)
+        if side is None:
+            continue
+        side_height = abs(side[BOTTOM_OF_CHIN_INDEX, 1] - side[TOP_OF_FOREHEAD_INDEX, 1])
+        side_depth = abs(side[tragi, 0].mean() - side[NOSE_TIP_INDEX, 0])
+        if side_height >= 1 and front_depth > 0:
+            factors.append(side_depth * front_height / side_height / front_depth)
+    if not factors:
+        return 1.0
+    return float(np.clip(np.mean(factors), MIN_DEPTH_FACTOR, MAX_DEPTH_FACTOR))
+
+def _rigid_align(points: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Rotates and translates `points` onto `reference` (Kabsch), without scaling."""
+    points_center, reference_center = points.mean(axis=0), reference.mean(axis=0)
+    u, _, vt = np.linalg.svd((points - points_center).T @ (reference - reference_center))
+    d = np.sign(np.linalg.det(u @ vt))
+    rotation = u @ np.diag([1.0, 1.0, d]) @ vt
+    return (points - points_center) @ rotation + reference_center
+
+def landmark_targets(deformer, landmarks: dict) -> Optional[np.ndarray]:
+    """
+    Where the deformer's anchors should go for this scan, in base-head units:
+    the front view's landmarks scaled to millimetres by the pupil distance,
+    with depth corrected from the profile views, and posed onto the base
+    head's anchors so that only the head's shape, not its pose, is fitted.
+    """
+    front = landmarks.get('front')
+    if front is None:
+        return None
+    ipd_pixels = np.linalg.norm(front[LEFT_PUPIL_INDEX, :2] - front[RIGHT_PUPIL_INDEX, :2])
+    if ipd_pixels < 1:
+        return None
+    points = np.asarray(front[deformer.landmarks], dtype=np.float64) * IMAGE_TO_HEAD
+    points[:, 2] *= _profile_depth_factor(landmarks)
+    points *= ASSUMED_IPD_MM / ipd_pixels / settings.SCAN_BASE_HEAD_UNIT_MM
+    return _rigid_align(points, deformer.anchor_positions)
+
+def reshape_model_to_match_photos(base_mesh, deformer, landmarks: dict):
+    """
+    Deforms the base head so its anchor vertices land on the scan's landmarks,
+    the rest of the surface following through the deformer's cached Laplacian
+    solve. Only landmarks are matched: there is no silhouette term, and the
+    back photo is not used.
+    """
+    targets = landmark_targets(deformer, landmarks)
+    if targets is None:
+        # The measurement stage reports the missing face; keep the base shape.
+        return base_mesh
+    shift = np.linalg.norm(targets - deformer.anchor_positions, axis=1).max()
+    if shift > MAX_ANCHOR_SHIFT * np.ptp(deformer.vertices, axis=0).max():
+        print(f"Warning: Landmarks would move the base head by {shift:.1f} units; keeping its shape.")
+        return base_mesh
+    base_mesh.vertices = deformer.deform(targets)
+    return base_mesh
+
+def generate_head_model(gender: str, landmarks: dict):
+    # The base heads are parsed once into a binary cache and kept mapped by the
+    # worker, and their deformers (with the factorised solve) stay resident
+    # too; each scan gets a copy-on-write instance instead of re-parsing the OBJ.
+    suffix = 'female' if gender == 'Female' else 'male'
+    base_mesh = registry.get(f'base_head_{suffix}').instantiate()
+    deformer = registry.get(f'head_deformer_{suffix}')
+
+    return reshape_model_to_match_photos(base_mesh, deformer, landmarks)
+
+def export_head_model(mesh, scan_id: str) -> dict:
+    # Written through the default storage, so the worker needs no shared media volume.
+    output_model_name = write_artifact(f"scans/outputs/{scan_id}.obj", mesh.export(file_type='obj').encode())
+
+    # Binary GLB (quantized) and PLY files for the full mesh and a
+    # decimated preview, which is what the mobile viewer downloads first.
+    variants = export_model_variants(mesh, scan_id)
 
     return {
-        "output_model_absolute_path": str(output_model_absolute_path),
-        "output_model_relative_path": f"scans/outputs/{output_model_filename}",
-        "gender": gender
+        "output_model_relative_path": output_model_name,
+        "variants": variants,
     }
\ No newline at end of file
@@ -0,0 +1,89 @@
+# scans/processing/stages.py
+
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+import os
+import time
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One named step of the scan pipeline.
+
+    `func` is called with the declared `inputs` taken from the run's state as
+    keyword arguments. A stage with one output returns that value; a stage with
+    several returns a dict keyed by output name. Outputs are merged back into
+    the state for the stages that follow.
+    """
+    name: str
+    func: Callable
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+
+
+class StageError(Exception):
+    """Raised when a stage fails; carries the timings recorded up to that point."""
+
+    def __init__(self, stage: str, error: Exception, timings: list):
+        super().__init__(f"[{stage}] {error}")
+        self.stage = stage
+        self.error = error
+        self.stage_timings = timings
+
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def _rss_mb() -> Optional[float]:
+    # The process's current resident set. Unlike ru_maxrss (the peak over the
+    # worker's whole life, which stops moving after the first scan) it goes
+    # down again, so the difference around a stage is that stage's footprint.
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return round(resident_pages * _PAGE_SIZE / (1024.0 * 1024.0), 1)
+
+
+def run_stages(stages, state: dict, on_stage: Callable = None) -> list:
+    """
+    Runs `stages` in order against `state` and returns one timing record per
+    stage: wall time, process CPU time (all threads), the process's RSS after
+    the stage and how much the stage grew it (what it left resident: its
+    outputs and any caches it filled). `on_stage(record)` is called as each
+    stage finishes.
+    """
+    timings = []
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in state]
+        if missing:
+            raise StageError(stage.name, KeyError(f"missing inputs: {', '.join(missing)}"), timings)
+
+        rss_before = _rss_mb()
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            result = stage.func(**{name: state[name] for name in stage.inputs})
+        except Exception as e:
+            raise StageError(stage.name, e, timings) from e
+
+        record = {
+            'stage': stage.name,
+            'wall_ms': round((time.perf_counter() - wall_started) * 1000, 1),
+            'cpu_ms': round((time.process_time() - cpu_started) * 1000, 1),
+            'rss_mb': _rss_mb(),
+        }
+        record['rss_growth_mb'] = (round(record['rss_mb'] - rss_before, 1)
+                                   if record['rss_mb'] is not None and rss_before is not None else None)
+        timings.append(record)
+
+        if len(stage.outputs) == 1:
+            result = {stage.outputs[0]: result}
+        for name in stage.outputs:
+            state[name] = result[name]
+
+        if on_stage is not None:
+            on_stage(record)
+    return timings
@@ -0,0 +1,169 @@
+# scans/processing/surface_measurement.py
+
+from typing import Dict, Optional
+from django.conf import settings
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from .measurement import (
+    ASSUMED_IPD_MM, BOTTOM_OF_CHIN_INDEX, LEFT_EAR_TRAGUS_INDEX, LEFT_PUPIL_INDEX,
+    RIGHT_EAR_TRAGUS_INDEX, RIGHT_PUPIL_INDEX, combine_measurements, get_dynamic_2d_measurements)
+
+GLABELLA_INDEX = 9
+LEFT_EYE_OUTER_CORNER_INDEX = 263
+RIGHT_EYE_OUTER_CORNER_INDEX = 33
+LEFT_EYEBROW_INDEX = 334
+RIGHT_EYEBROW_INDEX = 105
+# FaceMesh has no ear landmarks; these face-oval points sit just in front of the lobes.
+LEFT_EARLOBE_INDEX = 361
+RIGHT_EARLOBE_INDEX = 132
+
+# Horizontal sections searched for the maximum circumference, as fractions of
+# the head's height from its lowest point, and how many are cut.
+CIRCUMFERENCE_BAND = (0.45, 0.9)
+CIRCUMFERENCE_PLANES = 16
+# A projected landmark lands on the front-most vertex within this radius (mm).
+PROJECTION_RADIUS_MM = 6.0
+
+
+def _loop_lengths(loops) -> np.ndarray:
+    return np.array([np.linalg.norm(np.diff(loop, axis=0), axis=1).sum() for loop in loops])
+
+
+class SurfaceMeasurer:
+    """
+    Takes measurements off one reconstructed head, in millimetres.
+
+    The mesh's edge graph (for geodesics) and a KD-tree over its vertices seen
+    from the front (for placing landmarks) are built once here and shared by
+    every measurement of the scan. The base heads are modelled Y-up, facing +Z.
+    """
+
+    def __init__(self, mesh, unit_mm: float = 1.0):
+        if unit_mm != 1.0:
+            mesh = mesh.copy()
+            mesh.apply_scale(unit_mm)
+        self.mesh = mesh
+        self.vertices = np.asarray(mesh.vertices)
+        self.low, self.high = self.vertices.min(axis=0), self.vertices.max(axis=0)
+        self.center = (self.low + self.high) / 2.0
+
+        edges = mesh.edges_unique
+        vertex_count = len(self.vertices)
+        self.edge_graph = csr_matrix(
+            (mesh.edges_unique_length, (edges[:, 0], edges[:, 1])), shape=(vertex_count, vertex_count))
+        self.front_tree = cKDTree(self.vertices[:, :2])
+
+    def _largest_loop(self, origin, normal) -> Optional[np.ndarray]:
+        section = self.mesh.section(plane_origin=origin, plane_normal=normal)
+        if section is None or not section.discrete:
+            return None
+        loops = section.discrete
+        return loops[int(_loop_lengths(loops).argmax())]
+
+    def _arc_above(self, origin, normal, min_height: float) -> Optional[float]:
+        """Length of the largest loop in the plane, counting only the part above `min_height`."""
+        loop = self._largest_loop(origin, normal)
+        if loop is None:
+            return None
+        above = (loop[:-1, 1] >= min_height) & (loop[1:, 1] >= min_height)
+        return float(np.linalg.norm(np.diff(loop, axis=0)[above], axis=1).sum())
+
+    def max_circumference(self):
+        """(length, height) of the longest horizontal section within CIRCUMFERENCE_BAND."""
+        heights = self.low[1] + (self.high[1] - self.low[1]) * np.linspace(*CIRCUMFERENCE_BAND, CIRCUMFERENCE_PLANES)
+        sections = self.mesh.section_multiplane(
+            plane_origin=[0.0, 0.0, 0.0], plane_normal=[0.0, 1.0, 0.0], heights=heights)
+        lengths = np.array([
+            _loop_lengths(section.discrete).max() if section is not None and section.discrete else 0.0
+            for section in sections])
+        best = int(lengths.argmax())
+        return float(lengths[best]), float(heights[best])
+
+    def head_length(self, height: float) -> Optional[float]:
+        """Front-to-back extent of the head at `height`."""
+        loop = self._largest_loop([0.0, height, 0.0], [0.0, 1.0, 0.0])
+        return None if loop is None else float(np.ptp(loop[:, 2]))
+
+    def project_front(self, points_xy: np.ndarray) -> np.ndarray:
+        """Vertex indices where front-view points (mesh X/Y, in mm) meet the face."""
+        indices = []
+        for point, nearby in zip(points_xy, self.front_tree.query_ball_point(points_xy, PROJECTION_RADIUS_MM)):
+            if nearby:
+                indices.append(nearby[int(self.vertices[nearby, 2].argmax())])
+            else:
+                indices.append(int(self.front_tree.query(point)[1]))
+        return np.array(indices)
+
+    def geodesic(self, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """Shortest surface paths along mesh edges between paired vertices."""
+        distances = dijkstra(self.edge_graph, directed=False, indices=sources)
+        return distances[np.arange(len(sources)), targets]
+
+    def measure(self, front_landmarks: np.ndarray) -> Dict[str, float]:
+        circumference, brow_height = self.max_circumference()
+        measurements = {'head_circumference_A': circumference}
+        length = self.head_length(brow_height)
+        if length is not None:
+            measurements['head_length'] = length
+
+        # Place the front view's landmarks on the mesh: pixels are scaled to mm
+        # with the pupil distance, centred between the tragi and aligned so the
+        # glabella sits at the level of the maximum circumference.
+        ipd_pixels = np.linalg.norm(front_landmarks[LEFT_PUPIL_INDEX, :2] - front_landmarks[RIGHT_PUPIL_INDEX, :2])
+        mm_per_pixel = ASSUMED_IPD_MM / ipd_pixels
+        centre_u = (front_landmarks[LEFT_EAR_TRAGUS_INDEX, 0] + front_landmarks[RIGHT_EAR_TRAGUS_INDEX, 0]) / 2.0
+        glabella_v = front_landmarks[GLABELLA_INDEX, 1]
+        indices = np.array([
+            LEFT_EAR_TRAGUS_INDEX, RIGHT_EAR_TRAGUS_INDEX, BOTTOM_OF_CHIN_INDEX,
+            LEFT_EYEBROW_INDEX, RIGHT_EYEBROW_INDEX, LEFT_EARLOBE_INDEX, RIGHT_EARLOBE_INDEX,
+            LEFT_EYE_OUTER_CORNER_INDEX, RIGHT_EYE_OUTER_CORNER_INDEX,
+        ])
+        points_xy = np.stack([
+            self.center[0] + (front_landmarks[indices, 0] - centre_u) * mm_per_pixel,
+            brow_height + (glabella_v - front_landmarks[indices, 1]) * mm_per_pixel,
+        ], axis=1)
+        vertex_ids = dict(zip(indices.tolist(), self.project_front(points_xy).tolist()))
+        left_tragus = self.vertices[vertex_ids[LEFT_EAR_TRAGUS_INDEX]]
+        right_tragus = self.vertices[vertex_ids[RIGHT_EAR_TRAGUS_INDEX]]
+        chin = self.vertices[vertex_ids[BOTTOM_OF_CHIN_INDEX]]
+
+        forehead_to_back = self._arc_above(self.center, [1.0, 0.0, 0.0], brow_height)
+        if forehead_to_back is not None:
+            measurements['forehead_to_back_B'] = forehead_to_back
+
+        tragus_z = (left_tragus[2] + right_tragus[2]) / 2.0
+        tragus_height = (left_tragus[1] + right_tragus[1]) / 2.0
+        cross = self._arc_above([0.0, 0.0, tragus_z], [0.0, 0.0, 1.0], tragus_height)
+        if cross is not None:
+            measurements['cross_measurement_C'] = cross
+
+        # The strap loop under the chin and over the crown, in the plane
+        # through both that runs ear to ear.
+        crown = self.vertices[int(self.vertices[:, 1].argmax())]
+        normal = np.cross([1.0, 0.0, 0.0], crown - chin)
+        if np.linalg.norm(normal) > 0:
+            loop = self._largest_loop(chin, normal / np.linalg.norm(normal))
+            if loop is not None:
+                measurements['under_chin_D'] = float(_loop_lengths([loop])[0])
+
+        sources = np.array([vertex_ids[LEFT_EYEBROW_INDEX], vertex_ids[RIGHT_EYEBROW_INDEX],
+                            vertex_ids[LEFT_EYE_OUTER_CORNER_INDEX], vertex_ids[RIGHT_EYE_OUTER_CORNER_INDEX]])
+        targets = np.array([vertex_ids[LEFT_EARLOBE_INDEX], vertex_ids[RIGHT_EARLOBE_INDEX],
+                            vertex_ids[LEFT_EAR_TRAGUS_INDEX], vertex_ids[RIGHT_EAR_TRAGUS_INDEX]])
+        paths = self.geodesic(sources, targets)
+        if np.isfinite(paths[:2]).all():
+            measurements['eyebrow_to_earlobe_E'] = float(paths[:2].mean())
+        if np.isfinite(paths[2:]).all():
+            measurements['eye_corner_to_ear_F'] = float(paths[2:].mean())
+        return measurements
+
+
+def get_surface_measurements_from_model(mesh, gender: str, front_landmarks: Optional[np.ndarray]) -> Dict[str, float]:
+    dynamic_app_measurements = get_dynamic_2d_measurements(front_landmarks)
+    if dynamic_app_measurements is None:
+        raise ValueError("Failed to detect a face or landmarks in the front-facing photo.")
+
+    surface_measurements = SurfaceMeasurer(mesh, settings.SCAN_BASE_HEAD_UNIT_MM).measure(front_landmarks)
+    return combine_measurements(gender, dynamic_app_measurements, surface_measurements)
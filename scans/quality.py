@@ -0,0 +1,63 @@
+# scans/quality.py
+
+from typing import List
+from django.conf import settings
+import numpy as np
+
+# Only numpy and Pillow are used here: the same checks run in the web process
+# at upload time, where the ML stack must not be loaded (see scans/checks.py).
+
+
+class ImageQualityError(ValueError):
+    """Raised when an uploaded photo is unusable; the message says why."""
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian; low values mean few sharp edges."""
+    gray = gray.astype(np.float32)
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+                 - 4.0 * gray[1:-1, 1:-1])
+    return float(laplacian.var())
+
+
+def image_quality_issues(gray: np.ndarray, original_size, label: str) -> List[str]:
+    """
+    Checks a grayscale thumbnail (longest edge SCAN_QUALITY_THUMBNAIL_EDGE) of
+    a photo whose full size is `original_size` (width, height). Returns one
+    message per problem found, each starting with `label`.
+    """
+    issues = []
+    width, height = original_size
+    if min(width, height) < settings.SCAN_QUALITY_MIN_EDGE:
+        issues.append(f"The {label} is too small ({width}x{height}); at least "
+                      f"{settings.SCAN_QUALITY_MIN_EDGE} px on the shorter side is needed.")
+
+    brightness = float(gray.mean())
+    if brightness < settings.SCAN_QUALITY_MIN_BRIGHTNESS:
+        issues.append(f"The {label} is too dark; retake it in better light.")
+    elif brightness > settings.SCAN_QUALITY_MAX_BRIGHTNESS:
+        issues.append(f"The {label} is overexposed; avoid direct light behind or on the camera.")
+
+    if laplacian_variance(gray) < settings.SCAN_QUALITY_MIN_SHARPNESS:
+        issues.append(f"The {label} is too blurry; hold the camera still and make sure it is in focus.")
+    return issues
+
+
+def upload_quality_issues(upload, label: str) -> List[str]:
+    """Runs image_quality_issues() on an uploaded file, decoding only a thumbnail."""
+    from PIL import Image, UnidentifiedImageError
+
+    edge = settings.SCAN_QUALITY_THUMBNAIL_EDGE
+    try:
+        with Image.open(upload) as image:
+            original_size = image.size
+            # For JPEGs this decodes at 1/2, 1/4 or 1/8 scale instead of full size.
+            image.draft('L', (edge, edge))
+            image = image.convert('L')
+            image.thumbnail((edge, edge))
+            gray = np.asarray(image)
+    except (UnidentifiedImageError, OSError):
+        return [f"The {label} could not be read as an image."]
+    finally:
+        upload.seek(0)
+    return image_quality_issues(gray, original_size, label)
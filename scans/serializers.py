@@ -1,7 +1,25 @@
 # scans/serializers.py
 
+import hashlib
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Scan
+from .models import Scan, ScanUpload
+from .quality import upload_quality_issues
+from .uploadhandlers import file_sha256
+
+def content_addressed_image(upload, digest: str):
+    """
+    Stores an uploaded image under scans/inputs/<sha256><ext>. If that content
+    is already stored, the existing file is referenced instead of writing a copy.
+    """
+    extension = os.path.splitext(upload.name)[1].lower()
+    name = f"scans/inputs/{digest}{extension}"
+    if default_storage.exists(name):
+        return name
+    upload.name = f"{digest}{extension}"
+    return upload
 
 class ScanCreateSerializer(serializers.ModelSerializer):
     """
@@ -11,6 +29,77 @@ class ScanCreateSerializer(serializers.ModelSerializer):
         model = Scan
         fields = ('name', 'notes', 'custom_field', 'image_front', 'image_back', 'image_left', 'image_right')
 
+    def validate(self, attrs):
+        # The cheap pixel checks from the pipeline's quality stage, run before
+        # anything is stored so an unusable photo is rejected with a reason.
+        if settings.SCAN_QUALITY_CHECK_AT_UPLOAD:
+            errors = {}
+            for field in Scan.IMAGE_FIELDS:
+                issues = upload_quality_issues(attrs[field], f"{field[len('image_'):]} photo")
+                if issues:
+                    errors[field] = issues
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        # HashingUploadHandler hashes the files as they are received; anything
+        # that did not come through it is hashed here.
+        upload_digests = getattr(self.context.get('request'), 'upload_digests', {})
+        image_digests = []
+        for field in Scan.IMAGE_FIELDS:
+            upload = validated_data[field]
+            digest = upload_digests.get(field) or file_sha256(upload)
+            image_digests.append(digest)
+            validated_data[field] = content_addressed_image(upload, digest)
+
+        validated_data['input_digest'] = hashlib.sha256('\n'.join(image_digests).encode()).hexdigest()
+        return super().create(validated_data)
+
+
+class UploadFileSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        if value > settings.SCAN_UPLOAD_MAX_FILE_SIZE:
+            raise serializers.ValidationError(
+                f"Photos may be at most {settings.SCAN_UPLOAD_MAX_FILE_SIZE} bytes.")
+        return value
+
+
+class ScanUploadSerializer(serializers.ModelSerializer):
+    """
+    Opens a resumable upload session ({"files": {view: {"name", "size"}}} for
+    all four views) and reports how many bytes of each photo have arrived.
+    """
+    files = serializers.DictField(child=UploadFileSerializer())
+
+    class Meta:
+        model = ScanUpload
+        fields = ('id', 'files', 'created_at')
+        read_only_fields = ('id', 'created_at')
+
+    def validate_files(self, value):
+        if set(value) != set(ScanUpload.VIEWS):
+            raise serializers.ValidationError(
+                f"Declare exactly these photos: {', '.join(ScanUpload.VIEWS)}.")
+        return value
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for view, declared in data['files'].items():
+            declared['received'] = instance.received(view)
+        data['complete'] = instance.is_complete()
+        return data
+
+
+class ScanSummarySerializer(serializers.ModelSerializer):
+    """The light list projection (GET /api/scans/?projection=summary)."""
+    class Meta:
+        model = Scan
+        fields = ('id', 'name', 'status', 'created_at', 'updated_at')
+
 
 class ScanDetailSerializer(serializers.ModelSerializer):
     """
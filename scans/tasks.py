@@ -1,44 +1,288 @@
 # scans/tasks.py
 
-from celery import shared_task
-from .models import Scan
-from .processing.pipeline import run_full_scan_pipeline
+# The web tier imports this module to enqueue scans with .delay(), so nothing
+# from scans.processing (and with it cv2, mediapipe and trimesh) may be imported
+# at module level here. The processing package is only loaded inside the task
+# bodies and worker signal handlers, which run in the Celery workers.
+
+from datetime import timedelta
+from celery import chord, group, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from .events import EVENT_FIELDS, publish_scan_event
+from .models import Scan, ScanUpload
 import traceback
 
-@shared_task
+@worker_process_init.connect
+def warm_model_registry(**kwargs):
+    # Load every model once per worker process, before the first scan arrives.
+    from .processing.model_registry import registry
+    from .processing.inference_client import REMOTE_MODELS, inference_client
+
+    names = None
+    if inference_client.is_available():
+        # The host's inference server holds the only copy of these models.
+        names = [name for name in registry.names if name not in REMOTE_MODELS]
+    registry.warm_up(names)
+
+@worker_process_shutdown.connect
+def close_model_registry(**kwargs):
+    from .processing.model_registry import registry
+    registry.close()
+
+def _canvas_options(queue: str) -> dict:
+    # A scan's view and finish tasks run on the queue, and under the time
+    # limits, of the task that started it.
+    if queue == 'scans_bulk':
+        limits = (settings.SCAN_BULK_TASK_SOFT_TIME_LIMIT, settings.SCAN_BULK_TASK_TIME_LIMIT)
+    else:
+        limits = (settings.SCAN_TASK_SOFT_TIME_LIMIT, settings.SCAN_TASK_TIME_LIMIT)
+    return {'queue': queue, 'soft_time_limit': limits[0], 'time_limit': limits[1]}
+
+def _failure_message(e: Exception, task) -> str:
+    # StageError wraps the exception raised inside the stage.
+    if isinstance(getattr(e, 'error', e), SoftTimeLimitExceeded):
+        soft_time_limit = (task.request.timelimit or (None, None))[1] or task.soft_time_limit
+        stage = getattr(e, 'stage', None)
+        return (f"Processing took longer than {soft_time_limit}s"
+                f"{f' (in the {stage} stage)' if stage else ''} and was stopped.")
+    return str(e)
+
+def _heartbeat(scan_id: str) -> bool:
+    """
+    Marks the scan's run as alive for fail_stale_scans. Returns False if no run
+    is in progress any more, e.g. because the sweeper already failed it.
+    """
+    # .update() skips auto_now, so updated_at is set here.
+    return Scan.objects.filter(
+        Q(status=Scan.Status.PROCESSING) | Q(reprocess_status=Scan.Status.PROCESSING), id=scan_id,
+    ).update(updated_at=timezone.now()) > 0
+
+def _stage_publisher(scan):
+    # Streams each finished stage to the scan's owner as a progress event; each
+    # one is also a heartbeat for a long-running task.
+    def on_stage(record):
+        _heartbeat(str(scan.id))
+        publish_scan_event(scan, 'stage', stage=record['stage'], view=record.get('view'),
+                           wall_ms=record['wall_ms'])
+    return on_stage
+
+def _publish_status(scans):
+    # For scans changed with .update(), which leaves no instance to publish from.
+    for scan in scans.only(*EVENT_FIELDS):
+        publish_scan_event(scan, 'status')
+
+def _fail_runs(scans, failure_reason: str) -> int:
+    """
+    Fails the runs in progress among `scans`. A re-run of a completed scan only
+    records its failure in reprocess_status; the scan keeps its results.
+    """
+    now = timezone.now()
+    failed = scans.filter(reprocess_status=Scan.Status.PROCESSING).update(
+        reprocess_status=Scan.Status.FAILED, reprocess_failure_reason=failure_reason, updated_at=now)
+    failed += scans.filter(status=Scan.Status.PROCESSING).update(
+        status=Scan.Status.FAILED, failure_reason=failure_reason, updated_at=now)
+    if failed:
+        _publish_status(scans)
+    return failed
+
+def _start_scan(scan_id: str, reuse_duplicates: bool, queue: str):
+    """
+    Starts the pipeline for one scan as a chord: a group with one task per
+    view, which any worker on `queue` can pick up, then finish_scan_task once
+    all of them are done. Runs from the scans_bulk queue, and any run of a
+    completed scan, are tracked in reprocess_status; the scan keeps its status
+    and results until the new ones are written.
+    """
+    try:
+        rerun = queue == 'scans_bulk' or Scan.objects.filter(id=scan_id, status=Scan.Status.COMPLETED).exists()
+        run_status = ({'reprocess_status': Scan.Status.PROCESSING, 'reprocess_failure_reason': None}
+                      if rerun else {'status': Scan.Status.PROCESSING})
+        # Count the run before starting it: with acks_late a scan whose worker
+        # died is redelivered, and one that keeps killing its worker must not
+        # be retried forever.
+        # .update() skips auto_now, so updated_at (and with it the scan's ETag) is set here.
+        Scan.objects.filter(id=scan_id).update(
+            **run_status, processing_attempts=F('processing_attempts') + 1, updated_at=timezone.now())
+        scan = Scan.objects.get(id=scan_id)
+        if scan.processing_attempts > settings.SCAN_TASK_MAX_ATTEMPTS:
+            raise RuntimeError(
+                f"Processing was interrupted {scan.processing_attempts - 1} times; giving up on this scan.")
+
+        # Retried uploads and re-submitted photos reuse the results of an
+        # identical completed scan instead of running the pipeline again.
+        duplicate = scan.find_completed_duplicate() if reuse_duplicates and not rerun else None
+        if duplicate is not None:
+            print(f"Scan {scan_id} has the same inputs as completed scan {duplicate.id}; reusing its results.")
+            try:
+                scan.copy_results_from(duplicate)
+            except OSError as e:
+                # The duplicate's files are gone; compute this scan's own.
+                print(f"Warning: Could not copy the results of scan {duplicate.id}: {e}")
+                scan = Scan.objects.get(id=scan_id)
+            else:
+                scan.save()
+                publish_scan_event(scan, 'status')
+                return
+
+        options = _canvas_options(queue)
+        views = [field[len('image_'):] for field in Scan.IMAGE_FIELDS if getattr(scan, field)]
+        header = group(analyze_view_task.si(scan_id, view).set(**options) for view in views)
+        callback = (finish_scan_task.s(scan_id).set(**options)
+                    .on_error(fail_scan_task.si(scan_id, "A view of this scan could not be processed.")))
+        chord(header, callback).apply_async()
+        publish_scan_event(scan, 'status')
+
+    except Exception as e:
+        print(f"CRITICAL ERROR starting scan {scan_id}: {e}")
+        traceback.print_exc()
+        _fail_runs(Scan.objects.filter(id=scan_id), str(e))
+
+@shared_task(soft_time_limit=settings.SCAN_TASK_SOFT_TIME_LIMIT, time_limit=settings.SCAN_TASK_TIME_LIMIT)
 def process_scan_task(scan_id: str):
+    """Processes a newly uploaded scan; routed to the interactive 'scans' queue."""
+    _start_scan(scan_id, reuse_duplicates=True, queue='scans')
+
+@shared_task(soft_time_limit=settings.SCAN_BULK_TASK_SOFT_TIME_LIMIT, time_limit=settings.SCAN_BULK_TASK_TIME_LIMIT)
+def reprocess_scan_task(scan_id: str):
+    """Re-runs the full pipeline for an existing scan; routed to the 'scans_bulk' queue."""
+    _start_scan(scan_id, reuse_duplicates=False, queue='scans_bulk')
+
+@shared_task(bind=True)
+def analyze_view_task(self, scan_id: str, view: str) -> dict:
     """
-    The background task that runs the entire AI pipeline.
-    It handles success and failure and updates the database.
+    One view of a scan: quality check, face detection and landmarks (and the
+    gender for the front view). The result is checkpointed, so a redelivered
+    or repeated task returns it without running the models again.
     """
+    from .processing.checkpoints import crash_guard
+    from .processing.pipeline import analyze_view_checkpointed
+
     try:
+        if not _heartbeat(scan_id):
+            raise RuntimeError("Processing was stopped before this view was analysed.")
         scan = Scan.objects.get(id=scan_id)
-        
-        # Run the entire AI pipeline
-        results = run_full_scan_pipeline(scan)
+        with crash_guard(scan_id, f'view-{view}', settings.SCAN_TASK_MAX_ATTEMPTS):
+            return analyze_view_checkpointed(scan, view, on_stage=_stage_publisher(scan))
+    except Exception as e:
+        print(f"CRITICAL ERROR processing the {view} view of scan {scan_id}: {e}")
+        traceback.print_exc()
+        # Returned rather than raised, so the chord still reaches
+        # finish_scan_task, which fails the scan with this reason.
+        return {'view': view, 'error': _failure_message(e, self),
+                'stage_timings': getattr(e, 'stage_timings', [])}
+
+@shared_task(bind=True)
+def finish_scan_task(self, view_results: list, scan_id: str):
+    """
+    The chord's callback: reconstructs, measures and exports the scan from
+    its views and updates the database, whether it succeeded or failed. A
+    failed re-run leaves the scan's earlier results in place.
+    """
+    from .processing.checkpoints import clear_checkpoints, crash_guard
+    from .processing.model_registry import registry
+    from .processing.pipeline import finish_scan
+
+    if not _heartbeat(scan_id):
+        # The run was already failed (by fail_stale_scans or fail_scan_task);
+        # its outcome is recorded and its checkpoints may be gone.
+        print(f"Scan {scan_id} is no longer being processed; not finishing it.")
+        return
+
+    view_timings = [record for result in view_results for record in result.get('stage_timings', [])]
+    scan = Scan.objects.get(id=scan_id)
+    try:
+        errors = [result['error'] for result in view_results if 'error' in result]
+        if errors:
+            raise RuntimeError(errors[0])
+
+        with crash_guard(scan_id, 'finish', settings.SCAN_TASK_MAX_ATTEMPTS):
+            results = finish_scan(scan_id, {result['view']: result for result in view_results},
+                                  on_stage=_stage_publisher(scan))
         
         measurements = results.get('measurements', {})
         reconstruction = results.get('reconstruction', {})
         
         # Save all measurements to the database (in cm)
-        for key, value in measurements.items():
-            if hasattr(scan, key):
-                setattr(scan, key, float(value) / 10.0)
+        scan.set_measurements_mm(measurements)
         
         scan.processed_3d_model.name = reconstruction.get('output_model_relative_path')
+        scan.landmarks_file.name = results.get('landmarks_file')
+        scan.model_variants = reconstruction.get('variants', {})
+        scan.stage_timings = results.get('stage_timings')
+        scan.pipeline_version = settings.SCAN_PIPELINE_VERSION
         scan.status = Scan.Status.COMPLETED
+        scan.failure_reason = None
+        if scan.reprocess_status:
+            scan.reprocess_status = Scan.Status.COMPLETED
 
     except Exception as e:
         # If anything goes wrong, mark the scan as FAILED
-        error_message = str(e)
+        error_message = _failure_message(e, self)
         print(f"CRITICAL ERROR processing scan {scan_id}: {error_message}")
         traceback.print_exc()
         
         # It's important to re-fetch the object in the except block
         scan = Scan.objects.get(id=scan_id)
-        scan.status = Scan.Status.FAILED
-        scan.failure_reason = error_message
+        if scan.reprocess_status == Scan.Status.PROCESSING:
+            scan.reprocess_status = Scan.Status.FAILED
+            scan.reprocess_failure_reason = error_message
+        else:
+            scan.status = Scan.Status.FAILED
+            scan.failure_reason = error_message
+            # StageError carries the timings of the stages that ran before the failure.
+            scan.stage_timings = getattr(e, 'stage_timings', view_timings)
     
     finally:
         # Always save the final state, whether success or failure
-        scan.save()
\ No newline at end of file
+        scan.save()
+        publish_scan_event(scan, 'status')
+        # The checkpoints only exist to resume an interrupted run.
+        clear_checkpoints(scan_id)
+        print(f"Model registry after scan {scan_id}: {registry.report()}")
+
+@shared_task
+def fail_scan_task(scan_id: str, failure_reason: str):
+    """Error callback for a scan whose view task died outright (e.g. at the hard time limit)."""
+    _fail_runs(Scan.objects.filter(id=scan_id), failure_reason)
+
+@shared_task
+def fail_stale_scans():
+    """
+    Fails runs left PROCESSING (or re-runs left in reprocess_status PROCESSING)
+    with no heartbeat, because a worker was killed at the hard time limit or
+    a task was lost. Run periodically by celery beat.
+    """
+    from .processing.checkpoints import clear_checkpoints
+
+    now = timezone.now()
+    stale = Scan.objects.filter(
+        Q(status=Scan.Status.PROCESSING,
+          updated_at__lt=now - timedelta(minutes=settings.SCAN_STALE_AFTER_MINUTES)) |
+        Q(reprocess_status=Scan.Status.PROCESSING,
+          updated_at__lt=now - timedelta(minutes=settings.SCAN_REPROCESS_STALE_AFTER_MINUTES)))
+    scan_ids = list(stale.values_list('id', flat=True))
+    failed = _fail_runs(Scan.objects.filter(id__in=scan_ids),
+                        "Processing did not finish. Please upload the scan again.")
+    for scan_id in scan_ids:
+        clear_checkpoints(str(scan_id))
+    if failed:
+        print(f"Marked {failed} stale scan runs as failed.")
+    return failed
+
+@shared_task
+def expire_scan_uploads():
+    """Deletes chunked upload sessions that were never finalized, and their chunks."""
+    from .chunked_upload import discard_staging_dir
+
+    cutoff = timezone.now() - timedelta(hours=settings.SCAN_UPLOAD_EXPIRE_HOURS)
+    expired = list(ScanUpload.objects.filter(created_at__lt=cutoff))
+    for upload in expired:
+        discard_staging_dir(upload.staging_dir)
+        upload.delete()
+    if expired:
+        print(f"Deleted {len(expired)} expired upload sessions.")
+    return len(expired)
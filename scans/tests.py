@@ -1,3 +1,651 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .chunked_upload import ChunkError, append_chunk, parse_content_range
+from .detail_cache import get_cached_detail
+from .models import Scan, ScanUpload
+from .processing import measurement, reconstruction
+from .processing.deformation import LandmarkDeformer, load_anchors
+from .processing.export import BINARY_FORMATS, export_model_variants
+from .processing.measurement import MEASUREMENT_TABLE, get_dynamic_2d_measurements
+from .tasks import _start_scan, expire_scan_uploads
+
+# No Redis in tests: the detail cache and the throttles use local memory.
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'scans': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'scans'},
+}
+
+
+def per_pair_measurements(landmarks):
+    """The per-pair formulas MeasurementTable replaced, kept as the reference."""
+    def distance(a, b):
+        return float(np.linalg.norm(landmarks[a][:2] - landmarks[b][:2]))
+
+    ipd_pixels = distance(measurement.LEFT_PUPIL_INDEX, measurement.RIGHT_PUPIL_INDEX)
+    if ipd_pixels < 1: return None
+    pixels_per_mm = ipd_pixels / measurement.ASSUMED_IPD_MM
+    return {
+        "eye_to_eye": measurement.ASSUMED_IPD_MM,
+        "ear_to_ear": distance(measurement.LEFT_EAR_TRAGUS_INDEX, measurement.RIGHT_EAR_TRAGUS_INDEX) / pixels_per_mm,
+        "head_width": distance(measurement.LEFT_CHEEK_INDEX, measurement.RIGHT_CHEEK_INDEX) / pixels_per_mm,
+        "head_height": distance(measurement.TOP_OF_FOREHEAD_INDEX, measurement.BOTTOM_OF_CHIN_INDEX) / pixels_per_mm,
+    }
+
+
+class MeasurementTableTests(SimpleTestCase):
+    def fixed_landmarks(self, seed):
+        # 478 FaceMesh landmarks in pixel space of a 1080x1440 photo, depth included.
+        rng = np.random.default_rng(seed)
+        return (rng.random((478, 3)) * np.array([1080, 1440, 200]) - np.array([0, 0, 100])).astype(np.float32)
+
+    def test_matches_per_pair_formulas(self):
+        for seed in range(20):
+            landmarks = self.fixed_landmarks(seed)
+            expected = per_pair_measurements(landmarks)
+            actual = get_dynamic_2d_measurements(landmarks)
+            self.assertEqual(actual.keys(), expected.keys())
+            for name, value in expected.items():
+                self.assertAlmostEqual(actual[name], value, places=3, msg=name)
+
+    def test_batch_rows_match_single_landmark_arrays(self):
+        batch = np.stack([self.fixed_landmarks(seed) for seed in range(5)])
+        for landmarks, row in zip(batch, MEASUREMENT_TABLE.millimetres(batch)):
+            single = get_dynamic_2d_measurements(landmarks)
+            for name, value in MEASUREMENT_TABLE.as_dict(row).items():
+                self.assertAlmostEqual(value, single[name], places=3, msg=name)
+
+    def test_depth_is_ignored_for_2d_measurements(self):
+        landmarks = self.fixed_landmarks(0)
+        flattened = landmarks.copy()
+        flattened[:, 2] = 0
+        self.assertEqual(get_dynamic_2d_measurements(landmarks), get_dynamic_2d_measurements(flattened))
+
+    def test_no_usable_face(self):
+        landmarks = self.fixed_landmarks(0)
+        landmarks[measurement.RIGHT_PUPIL_INDEX] = landmarks[measurement.LEFT_PUPIL_INDEX]
+        self.assertIsNone(per_pair_measurements(landmarks))
+        self.assertIsNone(get_dynamic_2d_measurements(landmarks))
+        self.assertIsNone(get_dynamic_2d_measurements(None))
+
+
+class ContentRangeTests(SimpleTestCase):
+    def test_parses_start_and_length(self):
+        self.assertEqual(parse_content_range('bytes 0-99/1000', 1000), (0, 100))
+        self.assertEqual(parse_content_range('bytes 900-999/1000', 1000), (900, 100))
+
+    def test_rejects_malformed_headers(self):
+        for header in (None, '', 'bytes 0-99', 'bytes */1000', 'items 0-99/1000', 'bytes -1-99/1000'):
+            with self.assertRaises(ValueError, msg=header):
+                parse_content_range(header, 1000)
+
+    def test_rejects_ranges_outside_the_declared_file(self):
+        with self.assertRaises(ValueError):
+            parse_content_range('bytes 0-99/2000', 1000)
+        with self.assertRaises(ValueError):
+            parse_content_range('bytes 900-1000/1000', 1000)
+        with self.assertRaises(ValueError):
+            parse_content_range('bytes 100-99/1000', 1000)
+
+
+class AppendChunkTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'upload', 'front.part')
+        self.data = os.urandom(1000)
+
+    def append(self, start, end):
+        return append_chunk(self.path, io.BytesIO(self.data[start:end]), start, end - start)
+
+    def test_chunks_in_order_rebuild_the_file(self):
+        for start in range(0, 1000, 300):
+            received = self.append(start, min(start + 300, 1000))
+        self.assertEqual(received, 1000)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_out_of_order_chunk_is_refused_with_the_resume_offset(self):
+        self.append(0, 300)
+        with self.assertRaises(ChunkError) as raised:
+            self.append(600, 900)
+        self.assertEqual(raised.exception.received, 300)
+        self.assertEqual(os.path.getsize(self.path), 300)
+
+    def test_duplicate_chunk_is_refused_without_writing(self):
+        self.append(0, 300)
+        self.append(300, 600)
+        with self.assertRaises(ChunkError) as raised:
+            self.append(300, 600)
+        self.assertEqual(raised.exception.received, 600)
+        self.append(600, 1000)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_interrupted_chunk_keeps_what_arrived(self):
+        # The client promised 300 bytes but disconnected after 120.
+        received = append_chunk(self.path, io.BytesIO(self.data[:120]), 0, 300)
+        self.assertEqual(received, 120)
+        self.append(120, 1000)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+
+def sphere_deformer():
+    import trimesh
+
+    sphere = trimesh.creation.icosphere(subdivisions=3)
+    # No sidecar next to a missing OBJ, so the canonical anchor positions are used.
+    anchors = load_anchors(Path(tempfile.gettempdir()) / 'missing_head.obj', sphere.vertices)
+    return sphere, LandmarkDeformer(sphere.vertices, sphere.faces, anchors)
+
+
+class LandmarkDeformerTests(SimpleTestCase):
+    def setUp(self):
+        self.sphere, self.deformer = sphere_deformer()
+
+    def test_anchors_move_onto_targets(self):
+        rng = np.random.default_rng(0)
+        targets = self.deformer.anchor_positions + rng.normal(scale=0.05, size=self.deformer.anchor_positions.shape)
+
+        vertices = self.deformer.deform(targets)
+
+        np.testing.assert_allclose(vertices[self.deformer.anchor_vertices], targets, atol=1e-9)
+        self.assertEqual(vertices.shape, self.sphere.vertices.shape)
+
+    def test_shared_offset_translates_the_whole_mesh(self):
+        offset = np.array([0.1, -0.2, 0.3])
+
+        vertices = self.deformer.deform(self.deformer.anchor_positions + offset)
+
+        np.testing.assert_allclose(vertices, self.sphere.vertices + offset, atol=1e-5)
+
+    def test_anchors_are_distinct_vertices(self):
+        self.assertEqual(len(set(self.deformer.anchor_vertices)), len(self.deformer.anchor_vertices))
+        self.assertIn(measurement.LEFT_PUPIL_INDEX, self.deformer.landmarks)
+        self.assertIn(measurement.RIGHT_PUPIL_INDEX, self.deformer.landmarks)
+
+
+class ReshapeHeadTests(SimpleTestCase):
+    def setUp(self):
+        self.sphere, self.deformer = sphere_deformer()
+        pupils = [list(self.deformer.landmarks).index(index)
+                  for index in (measurement.LEFT_PUPIL_INDEX, measurement.RIGHT_PUPIL_INDEX)]
+        self.pupil_distance = np.linalg.norm(np.subtract(*self.deformer.anchor_positions[pupils]))
+
+    def front_landmarks(self):
+        # The sphere's anchors seen from the front at 200 pixels per unit.
+        front = np.zeros((478, 3))
+        front[self.deformer.landmarks] = self.deformer.anchor_positions * reconstruction.IMAGE_TO_HEAD * 200 + [320, 240, 0]
+        return front
+
+    def reshape(self, growth):
+        # Base-head units chosen so the photographed head is `growth` times the sphere.
+        unit_mm = measurement.ASSUMED_IPD_MM / (self.pupil_distance * growth)
+        mesh = self.sphere.copy()
+        with override_settings(SCAN_BASE_HEAD_UNIT_MM=unit_mm):
+            return reconstruction.reshape_model_to_match_photos(mesh, self.deformer, {'front': self.front_landmarks()})
+
+    def test_fits_anchors_to_the_scaled_face(self):
+        mesh = self.reshape(1.1)
+
+        anchors = mesh.vertices[self.deformer.anchor_vertices]
+        expected = self.deformer.anchor_positions * 1.1
+        np.testing.assert_allclose(anchors - anchors.mean(axis=0), expected - expected.mean(axis=0), atol=1e-6)
+        self.assertFalse(np.allclose(mesh.vertices, self.sphere.vertices))
+
+    def test_keeps_the_base_shape_for_implausible_landmarks(self):
+        mesh = self.reshape(3.0)
+
+        np.testing.assert_array_equal(mesh.vertices, self.sphere.vertices)
+
+    def test_keeps_the_base_shape_without_a_front_face(self):
+        mesh = self.sphere.copy()
+
+        reconstruction.reshape_model_to_match_photos(mesh, self.deformer, {'front': None})
+
+        np.testing.assert_array_equal(mesh.vertices, self.sphere.vertices)
+
+
+@override_settings(SCAN_MESH_QUANTIZATION_BITS=14, SCAN_MESH_PREVIEW_GRID=16)
+class ModelVariantExportTests(SimpleTestCase):
+    def setUp(self):
+        import trimesh
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(MEDIA_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.mesh = trimesh.creation.icosphere(subdivisions=4, radius=100.0)
+        self.variants = export_model_variants(self.mesh, 'scan')
+
+    def load(self, variant, file_format):
+        import trimesh
+
+        details = self.variants[variant][file_format]
+        with default_storage.open(details['name'], 'rb') as f:
+            data = f.read()
+        self.assertEqual(len(data), details['size'])
+        return trimesh.load(io.BytesIO(data), file_type=file_format, force='mesh', process=False)
+
+    def test_full_mesh_loads_back_within_the_quantization_step(self):
+        # 200 units over a 2**14 grid: positions are within half a step.
+        step = 200.0 / ((1 << 14) - 1)
+        for file_format, tolerance in (('glb', step / 2 + 1e-6), ('ply', 1e-4)):
+            with self.subTest(file_format):
+                loaded = self.load('full', file_format)
+                np.testing.assert_array_equal(loaded.faces, self.mesh.faces)
+                np.testing.assert_allclose(loaded.vertices, self.mesh.vertices, atol=tolerance)
+
+    def test_preview_has_fewer_vertices(self):
+        for file_format in BINARY_FORMATS:
+            with self.subTest(file_format):
+                preview = self.load('preview', file_format)
+                self.assertLess(len(preview.vertices), len(self.mesh.vertices) / 2)
+                self.assertEqual(len(preview.faces), self.variants['preview'][file_format]['faces'])
+                # The preview still spans the same head.
+                np.testing.assert_allclose(preview.bounds, self.mesh.bounds, atol=200.0 / 16)
+
+
+def jpeg_bytes(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(CACHES=TEST_CACHES, SCAN_QUALITY_CHECK_AT_UPLOAD=False)
+class ScanUploadApiTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(
+            MEDIA_ROOT=directory, SCAN_UPLOAD_DIR=os.path.join(directory, 'uploads'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('uploader', 'uploader@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.photos = {view: jpeg_bytes(color) for view, color in
+                       zip(ScanUpload.VIEWS, ('red', 'green', 'blue', 'white'))}
+        files = {view: {'name': f'{view}.jpg', 'size': len(data)} for view, data in self.photos.items()}
+        response = self.client.post('/api/scans/uploads/', {'files': files}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.upload_id = response.data['id']
+
+    def put_chunk(self, view, start, end):
+        data = self.photos[view]
+        return self.client.put(
+            f'/api/scans/uploads/{self.upload_id}/{view}/', data[start:end],
+            content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {start}-{end - 1}/{len(data)}'})
+
+    def test_resume_after_out_of_order_and_duplicate_chunks(self):
+        size = len(self.photos['front'])
+        half = size // 2
+        self.assertEqual(self.put_chunk('front', 0, half).data['received'], half)
+
+        duplicate = self.put_chunk('front', 0, half)
+        self.assertEqual(duplicate.status_code, 409)
+        self.assertEqual(duplicate.data['received'], half)
+
+        ahead = self.put_chunk('front', half + 10, size)
+        self.assertEqual(ahead.status_code, 409)
+        self.assertEqual(ahead.data['received'], half)
+
+        # A resuming client asks where to carry on from.
+        progress = self.client.get(f'/api/scans/uploads/{self.upload_id}/').data
+        self.assertEqual(progress['files']['front']['received'], half)
+        self.assertFalse(progress['complete'])
+
+        self.assertEqual(self.put_chunk('front', half, size).data['received'], size)
+        with open(ScanUpload.objects.get().part_path('front'), 'rb') as f:
+            self.assertEqual(f.read(), self.photos['front'])
+
+    def test_finalize_creates_the_scan_once_every_photo_arrived(self):
+        for view in ScanUpload.VIEWS[:-1]:
+            self.put_chunk(view, 0, len(self.photos[view]))
+        incomplete = self.client.post(f'/api/scans/uploads/{self.upload_id}/finalize/', {'name': 'Scan'})
+        self.assertEqual(incomplete.status_code, 409)
+
+        self.put_chunk('right', 0, len(self.photos['right']))
+        with mock.patch('scans.views.process_scan_task.delay') as delay:
+            response = self.client.post(f'/api/scans/uploads/{self.upload_id}/finalize/', {'name': 'Scan'})
+        self.assertEqual(response.status_code, 201, response.data)
+        delay.assert_called_once_with(response.data['id'])
+
+        scan = Scan.objects.get(id=response.data['id'])
+        with scan.image_front.open('rb') as f:
+            self.assertEqual(f.read(), self.photos['front'])
+        self.assertFalse(ScanUpload.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(settings.SCAN_UPLOAD_DIR, self.upload_id)))
+        # Only a finished run says which pipeline the results came from.
+        self.assertIsNone(scan.pipeline_version)
+        self.assertIsNotNone(scan.input_digest)
+
+    def test_expired_sessions_lose_their_chunks(self):
+        self.put_chunk('front', 0, 100)
+        staging_dir = ScanUpload.objects.get().staging_dir
+        self.assertTrue(os.path.exists(staging_dir))
+
+        self.assertEqual(expire_scan_uploads(), 0)
+        ScanUpload.objects.update(created_at=timezone.now() - timedelta(hours=settings.SCAN_UPLOAD_EXPIRE_HOURS + 1))
+        self.assertEqual(expire_scan_uploads(), 1)
+        self.assertFalse(os.path.exists(staging_dir))
+        self.assertFalse(ScanUpload.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DuplicateScanTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(MEDIA_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        images = {field: f'scans/inputs/{field}.jpg' for field in Scan.IMAGE_FIELDS}
+        self.source = Scan.objects.create(
+            user=self.user, name='First', status=Scan.Status.COMPLETED, input_digest='a' * 64,
+            pipeline_version=settings.SCAN_PIPELINE_VERSION, head_circumference_A=57.0, **images)
+        self.source.processed_3d_model.name = self.store(f'scans/outputs/{self.source.id}.obj', b'obj')
+        self.source.landmarks_file.name = self.store(f'scans/landmarks/{self.source.id}.npz', b'npz')
+        self.source.model_variants = {'full': {'glb': {
+            'name': self.store(f'scans/outputs/{self.source.id}.glb', b'glb'), 'size': 3, 'faces': 1}}}
+        self.source.save()
+        self.scan = Scan.objects.create(user=self.user, name='Second', input_digest='a' * 64, **images)
+
+    def store(self, name, data):
+        return default_storage.save(name, ContentFile(data))
+
+    def start(self):
+        with mock.patch('scans.tasks.chord') as chord, mock.patch('scans.tasks.publish_scan_event'):
+            _start_scan(str(self.scan.id), reuse_duplicates=True, queue='scans')
+        self.scan.refresh_from_db()
+        return chord
+
+    def test_identical_inputs_reuse_copies_of_the_results(self):
+        chord = self.start()
+
+        chord.assert_not_called()
+        self.assertEqual(self.scan.status, Scan.Status.COMPLETED)
+        self.assertEqual(self.scan.reused_from_id, self.source.id)
+        self.assertEqual(self.scan.pipeline_version, settings.SCAN_PIPELINE_VERSION)
+        self.assertEqual(self.scan.head_circumference_A, 57.0)
+        copied = [(self.scan.processed_3d_model.name, self.source.processed_3d_model.name),
+                  (self.scan.landmarks_file.name, self.source.landmarks_file.name),
+                  (self.scan.model_variants['full']['glb']['name'], self.source.model_variants['full']['glb']['name'])]
+        for name, source_name in copied:
+            self.assertIn(str(self.scan.id), name)
+            self.assertNotEqual(name, source_name)
+            with open(os.path.join(settings.MEDIA_ROOT, name), 'rb') as f, \
+                    open(os.path.join(settings.MEDIA_ROOT, source_name), 'rb') as source:
+                self.assertEqual(f.read(), source.read())
+
+    def test_results_of_an_older_pipeline_are_not_reused(self):
+        Scan.objects.filter(id=self.source.id).update(pipeline_version='old')
+
+        chord = self.start()
+
+        chord.assert_called_once()
+        self.assertEqual(self.scan.status, Scan.Status.PROCESSING)
+        self.assertIsNone(self.scan.reused_from_id)
+
+    def test_missing_result_files_run_the_pipeline(self):
+        os.remove(os.path.join(settings.MEDIA_ROOT, self.source.landmarks_file.name))
+
+        chord = self.start()
+
+        chord.assert_called_once()
+        self.assertIsNone(self.scan.reused_from_id)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ScanListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        images = {field: f'scans/inputs/{field}.jpg' for field in Scan.IMAGE_FIELDS}
+        for number in range(5):
+            Scan.objects.create(user=self.user, name=f'Scan {number}', status=Scan.Status.COMPLETED,
+                                model_variants={'full': {}}, **images)
+        # Created in the same instant: only the id orders them.
+        Scan.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+
+    def test_cursor_pages_are_stable_across_equal_created_at(self):
+        expected = [str(pk) for pk in Scan.objects.order_by('-id').values_list('id', flat=True)]
+
+        pages = []
+        url = '/api/scans/?page_size=2&projection=summary'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(([str(scan['id']) for scan in response.data['results']], response.data['previous']))
+            # A scan created while paging is newer than the cursor and never
+            # shifts the pages after it.
+            Scan.objects.create(user=self.user, name='New', **{field: 'x.jpg' for field in Scan.IMAGE_FIELDS})
+            url = response.data['next']
+
+        self.assertEqual(sum((ids for ids, _ in pages), []), expected)
+        # Paging back from the last page returns the page before it.
+        previous = self.client.get(pages[-1][1])
+        self.assertEqual([str(scan['id']) for scan in previous.data['results']], pages[-2][0])
+
+    def test_malformed_cursor_is_rejected(self):
+        # A well-formed cursor whose position is not a (created_at, id) pair.
+        response = self.client.get('/api/scans/?cursor=cD1ub3Bl')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_projections_only_read_their_columns(self):
+        for projection, fields in (('summary', {'id', 'name', 'status', 'created_at', 'updated_at'}), ('detail', None)):
+            with self.subTest(projection), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/api/scans/?projection={projection}')
+            self.assertEqual(response.status_code, 200)
+            # One query for the page: no deferred field is loaded afterwards.
+            self.assertEqual(len(queries), 1)
+            sql = queries[0]['sql']
+            for heavy in ('model_variants', 'quality_report', 'landmarks_file', 'processed_3d_model', 'image_front'):
+                self.assertNotIn(heavy, sql)
+            if fields is not None:
+                self.assertEqual(set(response.data['results'][0]), fields)
+
+
+S3_STORAGES = {
+    **settings.STORAGES,
+    'default': {'BACKEND': 'storages.backends.s3.S3Storage', 'OPTIONS': {
+        'bucket_name': 'scans', 'endpoint_url': 'http://minio:9000', 'access_key': 'minio',
+        'secret_key': 'minio-secret', 'region_name': 'us-east-1', 'addressing_style': 'path'}},
+}
+
+
+@override_settings(CACHES=TEST_CACHES, SCAN_MEDIA_X_ACCEL=True)
+class ScanFileDownloadTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.scan = Scan.objects.create(
+            user=self.owner, name='Scan', status=Scan.Status.COMPLETED,
+            model_variants={'full': {'glb': {'name': 'scans/outputs/scan.glb', 'size': 3, 'faces': 1}}},
+            **{field: f'scans/inputs/{"0" * 64}.jpg' for field in Scan.IMAGE_FIELDS})
+        self.url = f'/api/scans/{self.scan.id}/files/full-glb/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_other_users_get_404(self):
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+        self.client.force_authenticate(stranger)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_missing_variant_is_404(self):
+        response = self.client.get(f'/api/scans/{self.scan.id}/files/preview-glb/')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_filesystem_storage_redirects_to_protected_media(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/scans/outputs/scan.glb')
+        self.assertEqual(response['Content-Type'], 'model/gltf-binary')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn(f'scan-{self.scan.id}-full.glb', response['Content-Disposition'])
+
+        photo = self.client.get(f'/api/scans/{self.scan.id}/files/front/')
+        self.assertEqual(photo['X-Accel-Redirect'], f'/protected-media/scans/inputs/{"0" * 64}.jpg')
+        self.assertIn('immutable', photo['Cache-Control'])
+
+    @override_settings(STORAGES=S3_STORAGES)
+    def test_object_storage_redirects_to_a_presigned_protected_storage_url(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        target = response['X-Accel-Redirect']
+        path, _, query = target.partition('?')
+        self.assertEqual(path, '/protected-storage/scans/scans/outputs/scan.glb')
+        # The presigned query is the only credential nginx passes to the bucket.
+        self.assertIn('Signature=', query)
+        self.assertEqual(response['Content-Type'], 'model/gltf-binary')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ScanDetailCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password',
+                                             first_name='Ada', last_name='Lovelace')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.scan = Scan.objects.create(
+            user=self.user, name='Scan', status=Scan.Status.COMPLETED, notes='first',
+            **{field: f'scans/inputs/{field}.jpg' for field in Scan.IMAGE_FIELDS})
+        self.url = f'/api/scans/{self.scan.id}/'
+
+    def test_unchanged_scan_revalidates_to_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['Name'], 'Ada Lovelace')
+
+        revalidated = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], first['ETag'])
+
+    def test_finished_scan_is_served_from_the_cache(self):
+        first = self.client.get(self.url)
+        with mock.patch('scans.views.ScanDetailSerializer.to_representation') as serialize:
+            second = self.client.get(self.url)
+        serialize.assert_not_called()
+        self.assertEqual(second.data, first.data)
+
+    def test_saving_the_scan_invalidates_etag_and_cache(self):
+        first = self.client.get(self.url)
+        self.assertIsNotNone(get_cached_detail(self.scan.id, first['ETag']))
+        self.scan.notes = 'second'
+        self.scan.save()
+        self.assertIsNone(get_cached_detail(self.scan.id, first['ETag']))
+
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.data['Notes'], 'second')
+
+    def test_renaming_the_owner_invalidates_etag_and_cache(self):
+        first = self.client.get(self.url)
+        self.user.first_name = 'Augusta'
+        self.user.save()
+
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.data['Name'], 'Augusta Lovelace')
+
+
+class FakePubSub:
+    """Stands in for a redis.asyncio PubSub that delivers `messages`, then goes quiet."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    async def subscribe(self, channel):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages, timeout):
+        if self.messages:
+            return {'data': json.dumps(self.messages.pop(0))}
+        return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self, messages=()):
+        self._pubsub = FakePubSub(messages)
+
+    def pubsub(self):
+        return self._pubsub
+
+    async def aclose(self):
+        pass
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ScanEventStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('listener', 'listener@example.com', 'password')
+        self.scan = Scan.objects.create(
+            user=self.user, name='Scan', status=Scan.Status.COMPLETED,
+            **{field: f'scans/inputs/{field}.jpg' for field in Scan.IMAGE_FIELDS})
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def frames(self, messages=(), limit=5):
+        """The SSE frames of ?scan=<id> (up to `limit`), as parsed JSON; None for keep-alives."""
+        with mock.patch('scans.views.aioredis.Redis.from_url', return_value=FakeRedis(messages)):
+            response = await AsyncClient().get(
+                '/api/scans/events/', {'scan': str(self.scan.id)}, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            frames = []
+            async for chunk in response.streaming_content:
+                text = chunk.decode() if isinstance(chunk, bytes) else chunk
+                frames.append(json.loads(text.split('data: ', 1)[1]) if 'data: ' in text else None)
+                if len(frames) == limit:
+                    break
+            return frames
+
+    async def test_finished_scan_sends_its_status_and_ends(self):
+        frames = await self.frames()
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0]['status'], Scan.Status.COMPLETED)
+        self.assertNotIn('reprocess_status', frames[0])
+
+    async def test_reprocessed_scan_stays_open_until_the_rerun_finishes(self):
+        await Scan.objects.filter(id=self.scan.id).aupdate(reprocess_status=Scan.Status.PROCESSING)
+        final = {'event': 'status', 'scan': str(self.scan.id), 'status': Scan.Status.COMPLETED,
+                 'reprocess_status': Scan.Status.COMPLETED}
+        frames = await self.frames([final])
+        self.assertEqual(frames[0]['reprocess_status'], Scan.Status.PROCESSING)
+        self.assertEqual(frames[1:], [final])
@@ -0,0 +1,38 @@
+# scans/uploadhandlers.py
+
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 of every uploaded file while it streams in.
+
+    It sits in front of Django's regular upload handlers and passes each chunk
+    on untouched, so the file is never read a second time just to hash it.
+    The hex digests are left on `request.upload_digests`, keyed by field name.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_digests'):
+            self.request.upload_digests = {}
+        self.request.upload_digests[self.field_name] = self._sha256.hexdigest()
+        # Let the next handler build the actual uploaded file.
+        return None
+
+
+def file_sha256(file) -> str:
+    """Hashes a file that did not come through HashingUploadHandler."""
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
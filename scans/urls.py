@@ -2,13 +2,17 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ScanViewSet
+from .views import ScanUploadViewSet, ScanViewSet, scan_events
 
 # DefaultRouter automatically creates the standard URLs for a ViewSet
 # (e.g., /scans/, /scans/{id}/)
 router = DefaultRouter()
+# Registered first: ScanViewSet's detail route would otherwise match 'uploads/'.
+router.register(r'uploads', ScanUploadViewSet, basename='scan-upload')
 router.register(r'', ScanViewSet, basename='scan')
 
 urlpatterns = [
+    # Ahead of the router, whose detail route would otherwise match 'events/'.
+    path('events/', scan_events, name='scan-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,33 +1,115 @@
 # scans/views.py
 
-from rest_framework import viewsets, status
+import json
+import os
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+import redis.asyncio as aioredis
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.generics import get_object_or_404
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Scan
-from .serializers import ScanCreateSerializer, ScanDetailSerializer
+from .detail_cache import CACHED_STATUSES, cache_detail, get_cached_detail, scan_etag
+from .downloads import protected_file_response, scan_file_name
+from .chunked_upload import ChunkError, StagedUpload, append_chunk, discard_staging_dir, parse_content_range
+from .events import EVENT_FIELDS, scan_event, user_channel
+from .models import Scan, ScanUpload
+from .pagination import ScanCursorPagination
+from .serializers import ScanCreateSerializer, ScanDetailSerializer, ScanSummarySerializer, ScanUploadSerializer
+from .uploadhandlers import HashingUploadHandler
 
 # --- CRITICAL CHANGE: We now import the task, not the pipeline ---
+# scans.tasks only imports the processing package inside the task body, so this
+# import keeps cv2/mediapipe/trimesh out of the web workers (see scans/checks.py).
 from .tasks import process_scan_task
 
 class ScanViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = ScanCursorPagination
+
+    # Columns each list projection reads; the rest of the row (measurements,
+    # JSON diagnostics, file names) is never loaded. Chosen with ?projection=.
+    LIST_PROJECTIONS = {
+        'detail': (ScanDetailSerializer, (
+            'id', 'created_at', 'head_width', 'head_length', 'ear_to_ear', 'eye_to_eye', 'notes',
+            'custom_field', 'user__first_name', 'user__last_name')),
+        'summary': (ScanSummarySerializer, ('id', 'name', 'status', 'created_at', 'updated_at')),
+    }
+
+    def _list_projection(self):
+        return self.LIST_PROJECTIONS.get(self.request.query_params.get('projection'), self.LIST_PROJECTIONS['detail'])
 
     def get_queryset(self):
-        return Scan.objects.filter(user=self.request.user)
+        queryset = Scan.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            serializer_class, fields = self._list_projection()
+            if any(field.startswith('user__') for field in fields):
+                # One join instead of a user query per scan for the Name column.
+                queryset = queryset.select_related('user')
+            queryset = queryset.only(*fields)
+        elif self.action == 'retrieve':
+            queryset = queryset.select_related('user')
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
             return ScanCreateSerializer
+        if self.action == 'list':
+            return self._list_projection()[0]
         return ScanDetailSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        The scan's details, with an ETag taken from its updated_at, status and
+        owner's name, and a Last-Modified from updated_at. A client
+        revalidating an unchanged scan gets a 304 after a single indexed
+        lookup; finished scans are otherwise served from the 'scans' cache
+        without re-serializing.
+        """
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        scan_id, updated_at, scan_status, first_name, last_name = get_object_or_404(
+            self.get_queryset().values_list('id', 'updated_at', 'status', 'user__first_name', 'user__last_name'),
+            **lookup)
+        etag = scan_etag(updated_at, scan_status, f"{first_name} {last_name}")
+        last_modified = int(updated_at.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = get_cached_detail(scan_id, etag) if scan_status in CACHED_STATUSES else None
+            if data is None:
+                data = dict(self.get_serializer(self.get_object()).data)
+                if scan_status in CACHED_STATUSES:
+                    cache_detail(scan_id, etag, data)
+            response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Always revalidate: notes can still be edited and a scan reprocessed.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
     def create(self, request, *args, **kwargs):
         """
         This is now a fast, asynchronous method.
         It creates the scan, triggers the background task, and responds instantly.
         """
+        # Hash the images while the multipart body is parsed (request.data is
+        # still unread here) so duplicate uploads can be detected for free.
+        request.upload_handlers.insert(0, HashingUploadHandler(request._request))
+
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
@@ -40,4 +122,204 @@ class ScanViewSet(viewsets.ModelViewSet):
 
         headers = self.get_success_headers(serializer.data)
         # We return the initial "PROCESSING" state of the object
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=True, methods=['get'], url_path='model')
+    def model(self, request, pk=None):
+        """
+        Returns the 3D model file the client asks for:
+        ?variant=preview|full (default full) and ?file_type=glb|ply (default glb).
+        """
+        scan = self.get_object()
+        variant = request.query_params.get('variant', 'full')
+        file_type = request.query_params.get('file_type', 'glb')
+
+        exported = scan.model_variants.get(variant, {}).get(file_type)
+        if exported is None:
+            return Response(
+                {'error': f"No '{variant}' model is available as {file_type} for this scan."},
+                status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'variant': variant,
+            'file_type': file_type,
+            'size': exported['size'],
+            'faces': exported['faces'],
+            'url': request.build_absolute_uri(
+                reverse('scan-file', kwargs={'pk': scan.pk, 'file_key': f'{variant}-{file_type}'})),
+        })
+
+    @action(detail=True, methods=['get'], url_path=r'files/(?P<file_key>[a-z]+(?:-[a-z]+)?)', url_name='file')
+    def file(self, request, pk=None, file_key=None):
+        """
+        Downloads one of the user's scan files: front|back|left|right (the
+        photos), model (the OBJ) or <variant>-<file_type> (e.g. full-glb).
+        Ownership is checked here; nginx sends the bytes.
+        """
+        scan = self.get_object()
+        name = scan_file_name(scan, file_key)
+        if name is None:
+            return Response({'error': f"This scan has no '{file_key}' file."}, status=status.HTTP_404_NOT_FOUND)
+        filename = f"scan-{scan.id}-{file_key.split('-')[0]}{os.path.splitext(name)[1]}"
+        return protected_file_response(name, filename)
+
+
+class ScanUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                        viewsets.GenericViewSet):
+    """
+    Resumable upload of a scan's photos, for connections that cannot be
+    trusted with one 100 MB POST:
+
+    1. POST /api/scans/uploads/ declares the four photos and opens a session.
+    2. PUT /api/scans/uploads/{id}/{view}/ with a Content-Range header sends a
+       byte range of one photo. GET /api/scans/uploads/{id}/ tells a resuming
+       client how much of each photo has arrived.
+    3. POST /api/scans/uploads/{id}/finalize/ with the scan's name, notes and
+       custom_field creates the scan and starts processing it.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ScanUploadSerializer
+
+    def get_queryset(self):
+        return ScanUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        discard_staging_dir(instance.staging_dir)
+        instance.delete()
+
+    @action(detail=True, methods=['put'], url_path=r'(?P<view>front|back|left|right)')
+    def chunk(self, request, pk=None, view=None):
+        """Appends the request body to the photo at the offset given by Content-Range."""
+        upload = self.get_object()
+        size = upload.files[view]['size']
+        try:
+            start, length = parse_content_range(request.headers.get('Content-Range'), size)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.SCAN_UPLOAD_MAX_CHUNK_SIZE:
+            return Response({'error': f"Chunks may be at most {settings.SCAN_UPLOAD_MAX_CHUNK_SIZE} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if request.headers.get('Content-Length') != str(length):
+            return Response({'error': "The body must be exactly the bytes of the Content-Range."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # request.data is never touched, so the body is streamed to disk
+        # instead of being parsed into memory.
+        try:
+            received = append_chunk(upload.part_path(view), request.stream, start, length)
+        except ChunkError as e:
+            return Response({'error': str(e), 'received': e.received}, status=status.HTTP_409_CONFLICT)
+        return Response({'view': view, 'size': size, 'received': received})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Creates the scan from the session's photos, which are moved into place, not copied."""
+        upload = self.get_object()
+        if not upload.is_complete():
+            return Response({'error': "Not every photo has been uploaded in full.",
+                             **self.get_serializer(upload).data},
+                            status=status.HTTP_409_CONFLICT)
+
+        data = {field: request.data[field] for field in ('name', 'notes', 'custom_field') if field in request.data}
+        staged = {f'image_{view}': StagedUpload(upload.part_path(view), upload.files[view]['name'])
+                  for view in ScanUpload.VIEWS}
+        serializer = ScanCreateSerializer(data={**data, **staged}, context=self.get_serializer_context())
+        try:
+            serializer.is_valid(raise_exception=True)
+            scan = serializer.save(user=request.user)
+        finally:
+            for staged_upload in staged.values():
+                staged_upload.close()
+
+        discard_staging_dir(upload.staging_dir)
+        upload.delete()
+        process_scan_task.delay(str(scan.id))
+        return Response({'id': str(scan.id), **serializer.data}, status=status.HTTP_201_CREATED)
+
+
+TERMINAL_STATUSES = (Scan.Status.COMPLETED, Scan.Status.FAILED)
+
+
+def _is_final(payload: dict) -> bool:
+    # A completed scan that is being reprocessed still has its final event to come.
+    return (payload['status'] in TERMINAL_STATUSES
+            and payload.get('reprocess_status') != Scan.Status.PROCESSING)
+
+
+def _sse(payload: dict) -> str:
+    return f"event: {payload['event']}\ndata: {json.dumps(payload)}\n\n"
+
+
+async def _event_stream(user_id, scan_id=None):
+    """
+    Relays the user's scan events from Redis. With `scan_id`, starts with the
+    scan's current status, passes on only its events and ends once it is
+    COMPLETED or FAILED and not being reprocessed.
+    """
+    client = aioredis.Redis.from_url(settings.SCAN_EVENTS_REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the status, so an update landing in
+        # between is not lost.
+        await pubsub.subscribe(user_channel(user_id))
+        if scan_id is not None:
+            scan = await Scan.objects.only(*EVENT_FIELDS).aget(id=scan_id)
+            payload = scan_event(scan, 'status')
+            yield _sse(payload)
+            if _is_final(payload):
+                return
+
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=settings.SCAN_EVENTS_HEARTBEAT_SECONDS)
+            if message is None:
+                # A comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+                continue
+            payload = json.loads(message['data'])
+            if scan_id is not None and payload['scan'] != scan_id:
+                continue
+            yield _sse(payload)
+            if scan_id is not None and payload['event'] == 'status' and _is_final(payload):
+                return
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+@require_GET
+async def scan_events(request):
+    """
+    Server-Sent Events stream of the user's scan status and stage progress,
+    so the app does not have to poll. ?scan=<id> follows a single scan until
+    it finishes. Served by the ASGI app (see compose.yaml's events service).
+    """
+    try:
+        authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if authenticated is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    user = authenticated[0]
+
+    scan_id = request.GET.get('scan')
+    if scan_id is not None:
+        try:
+            scan = await Scan.objects.filter(id=scan_id, user=user).only('id').afirst()
+        except ValidationError:
+            # Not a UUID.
+            scan = None
+        if scan is None:
+            return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        # Events carry the canonical form of the id.
+        scan_id = str(scan.id)
+
+    response = StreamingHttpResponse(_event_stream(user.id, scan_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tells nginx to pass events on as they arrive instead of buffering them.
+    response['X-Accel-Buffering'] = 'no'
+    return response